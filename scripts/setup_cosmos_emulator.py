@@ -5,6 +5,7 @@ This should be run once after the emulator starts to create the necessary infras
 """
 
 import os
+import socket
 import sys
 import time
 from azure.cosmos import CosmosClient, PartitionKey
@@ -14,6 +15,14 @@ import logging
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 logger = logging.getLogger(__name__)
 
+# Secrets are only ever fetched by point reads on id, so index nothing except
+# created_at (for age-based queries); skipping the encrypted payload saves write RUs.
+SECRETS_INDEXING_POLICY = {
+    "indexingMode": "consistent",
+    "includedPaths": [{"path": "/created_at/?"}],
+    "excludedPaths": [{"path": "/*"}],
+}
+
 def setup_cosmos_emulator():
     """Set up the Cosmos DB emulator with database and container"""
     
@@ -36,7 +45,8 @@ def setup_cosmos_emulator():
         container = database.create_container_if_not_exists(
             id=container_name,
             partition_key=PartitionKey(path="/link_id"),
-            default_ttl=86400  # 24 hours in seconds
+            default_ttl=86400,  # 24 hours in seconds
+            indexing_policy=SECRETS_INDEXING_POLICY,
         )
         logger.info(f"Container '{container_name}' ready with 24-hour TTL")
         
@@ -51,27 +61,33 @@ def setup_cosmos_emulator():
         logger.error(f"❌ Failed to set up Cosmos DB emulator: {e}")
         return False
 
-def wait_for_emulator(max_attempts=30, delay=5):
-    """Wait for the Cosmos DB emulator to be ready"""
+def wait_for_emulator(timeout=145, delay=1, max_delay=10):
+    """Wait for the Cosmos DB emulator to be ready, giving up after `timeout` seconds"""
     endpoint = "https://localhost:8081"
     key = "C2y6yDjf5/R+ob0N8A7Cgv30VRDJIWEHLM+4QDU5DE2nQ9nDuVTqobD4b8mGGyPMbIZnqyMsEcaGQy67XIw/Jw=="
+    # Bound the total wait, not the attempt count, so backoff never stretches the worst case
+    deadline = time.monotonic() + timeout
+    attempt = 0
     
-    for attempt in range(max_attempts):
+    while True:
+        attempt += 1
         try:
+            # Probe the port first; a TCP connect is far cheaper than a TLS + auth round-trip
+            socket.create_connection(("localhost", 8081), timeout=1).close()
+            # The port can open before the gateway serves requests, so confirm with the SDK
             client = CosmosClient(endpoint, key, connection_verify=False)
-            # Try a simple operation to test connectivity
             list(client.list_databases())
             logger.info("Cosmos DB emulator is ready!")
             return True
         except Exception as e:
-            if attempt < max_attempts - 1:
-                logger.info(f"Waiting for emulator... (attempt {attempt + 1}/{max_attempts})")
-                time.sleep(delay)
-            else:
-                logger.error(f"Emulator not ready after {max_attempts} attempts: {e}")
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logger.error(f"Emulator not ready after {timeout}s ({attempt} attempts): {e}")
                 return False
-    
-    return False
+            wait = min(delay, remaining)
+            logger.info(f"Waiting for emulator... (attempt {attempt}, retry in {wait:.0f}s)")
+            time.sleep(wait)
+            delay = min(delay * 2, max_delay)  # Exponential backoff
 
 if __name__ == "__main__":
     logger.info("🚀 Setting up Cosmos DB emulator for Transio...")
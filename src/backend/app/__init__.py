@@ -1,5 +1,8 @@
+import os
+
 from azure.cosmos import CosmosClient
 from azure.identity import DefaultAzureCredential
+from flask import current_app
 import logging
 import ssl
 
@@ -31,7 +34,6 @@ def init_cosmos_db(app):
             logger.info("Using managed identity for Cosmos DB authentication")
             
             # Check if a User-assigned managed identity client ID is provided
-            import os
             client_id = os.environ.get('AZURE_CLIENT_ID')
             
             if client_id:
@@ -73,5 +75,4 @@ def init_cosmos_db(app):
 
 def get_cosmos_container():
     """Get the Cosmos DB container from the current Flask app"""
-    from flask import current_app
     return getattr(current_app, 'cosmos_container', None)
@@ -34,6 +34,21 @@ class Config:
     # Add MAX_SECRET_LENGTH, defaulting to 100KB if not set in .env
     MAX_SECRET_LENGTH_KB = int(os.getenv("MAX_SECRET_LENGTH_KB", "100"))
     MAX_SECRET_LENGTH_BYTES = MAX_SECRET_LENGTH_KB * 1024
+    # Per-document Cosmos DB TTL; expiry is enforced by the database, not the app
+    SECRET_EXPIRY_HOURS = int(os.getenv("SECRET_EXPIRY_HOURS", "24"))
+    SECRET_TTL_SECONDS = SECRET_EXPIRY_HOURS * 3600
+    # Write AES-GCM tokens instead of Fernet; enable only once every replica can read them
+    USE_AESGCM_WRITES = os.getenv("USE_AESGCM_WRITES", "false").lower() in (
+        "true",
+        "1",
+        "t",
+    )
+    # Opt-in Rust Fernet backend; requires `pip install rfernet`
+    USE_RFERNET = os.getenv("USE_RFERNET", "false").lower() in (
+        "true",
+        "1",
+        "t",
+    )
 
     # --- Cosmos DB Configuration ---
     COSMOS_ENDPOINT = os.getenv("COSMOS_ENDPOINT")
@@ -69,39 +84,50 @@ class Config:
         # This is the well-known emulator key for local development
         COSMOS_KEY = "C2y6yDjf5/R+ob0N8A7Cgv30VRDJIWEHLM+4QDU5DE2nQ9nDuVTqobD4b8mGGyPMbIZnqyMsEcaGQy67XIw/Jw=="
 
-    if not MASTER_ENCRYPTION_KEY:
-        # Fail fast - encryption key is required for this security application
-        raise ValueError(
-            "MASTER_ENCRYPTION_KEY not set. Please set it in .env file or environment."
-        )
+    @classmethod
+    def load_encryption_keys(cls) -> tuple[bytes, ...]:
+        """
+        Validates the master keys and caches them on MASTER_ENCRYPTION_KEYS.
+        Runs once, from encryption module init, rather than on every import of config.
+        """
+        if "MASTER_ENCRYPTION_KEYS" in vars(cls):
+            return cls.MASTER_ENCRYPTION_KEYS
 
-    # Collect all available keys for MultiFernet
-    encryption_keys = []
+        if not cls.MASTER_ENCRYPTION_KEY:
+            # Fail fast - encryption key is required for this security application
+            raise ValueError(
+                "MASTER_ENCRYPTION_KEY not set. Please set it in .env file or environment."
+            )
 
-    # Ensure the current key is bytes for Fernet and validate it's a proper Fernet key
-    try:
-        current_key_bytes = MASTER_ENCRYPTION_KEY.encode("utf-8")
-        # Test if it's a valid Fernet key by attempting to initialize a Fernet instance
-        Fernet(current_key_bytes)  # This will raise if invalid
-        encryption_keys.append(current_key_bytes)
-    except Exception as e:
-        # Log the error and re-raise with a clearer message
-        logging.error(f"Invalid MASTER_ENCRYPTION_KEY: {e}")
-        raise ValueError(f"Invalid MASTER_ENCRYPTION_KEY: {e}")
+        # Collect all available keys for MultiFernet
+        encryption_keys = []
 
-    # Add previous key if available
-    if MASTER_ENCRYPTION_KEY_PREVIOUS:
+        # Ensure the current key is bytes for Fernet and validate it's a proper Fernet key
         try:
-            previous_key_bytes = MASTER_ENCRYPTION_KEY_PREVIOUS.encode("utf-8")
-            # Test if it's a valid Fernet key
-            Fernet(previous_key_bytes)  # This will raise if invalid
-            encryption_keys.append(previous_key_bytes)
-            logging.info(
-                "Previous encryption key loaded successfully for key rotation support."
-            )
+            current_key_bytes = cls.MASTER_ENCRYPTION_KEY.encode("utf-8")
+            # Test if it's a valid Fernet key by attempting to initialize a Fernet instance
+            Fernet(current_key_bytes)  # This will raise if invalid
+            encryption_keys.append(current_key_bytes)
         except Exception as e:
-            # Log the error but don't fail - previous key is optional
-            logging.warning(f"Invalid MASTER_ENCRYPTION_KEY_PREVIOUS (ignoring): {e}")
+            # Log the error and re-raise with a clearer message
+            logging.error(f"Invalid MASTER_ENCRYPTION_KEY: {e}")
+            raise ValueError(f"Invalid MASTER_ENCRYPTION_KEY: {e}")
+
+        # Add previous key if available
+        if cls.MASTER_ENCRYPTION_KEY_PREVIOUS:
+            try:
+                previous_key_bytes = cls.MASTER_ENCRYPTION_KEY_PREVIOUS.encode("utf-8")
+                # Test if it's a valid Fernet key
+                Fernet(previous_key_bytes)  # This will raise if invalid
+                encryption_keys.append(previous_key_bytes)
+                logging.info(
+                    "Previous encryption key loaded successfully for key rotation support."
+                )
+            except Exception as e:
+                # Log the error but don't fail - previous key is optional
+                logging.warning(f"Invalid MASTER_ENCRYPTION_KEY_PREVIOUS (ignoring): {e}")
 
-    # Store the validated keys for use by encryption module
-    MASTER_ENCRYPTION_KEYS = encryption_keys
+        # Store the validated keys for use by encryption module; frozen so the
+        # cached value cannot be mutated after the cipher suites are built
+        cls.MASTER_ENCRYPTION_KEYS = tuple(encryption_keys)
+        return cls.MASTER_ENCRYPTION_KEYS
@@ -1,17 +1,79 @@
 # backend/app/encryption.py
+import base64
 import logging
+import os
+from cryptography.exceptions import InvalidTag
 from cryptography.fernet import Fernet, MultiFernet, InvalidToken
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from .config import Config
 
+try:
+    # Optional Rust implementation of Fernet, only used when Config.USE_RFERNET is set
+    import rfernet
+except ImportError:
+    rfernet = None
+
 # Initialize logger for this module
 logger = logging.getLogger(__name__)
 
-# Initialize MultiFernet with the master keys from config
+# AES-GCM tokens are laid out as: version byte || 12-byte random nonce || ciphertext || 16-byte tag.
+# Fernet tokens always start with b"g" (base64 of their 0x80 version), so the two never collide.
+AESGCM_TOKEN_VERSION = b"\x02"
+AESGCM_NONCE_SIZE = 12
+AESGCM_KEY_INFO = b"transio-aesgcm-v1"
+
+
+def _derive_aesgcm_key(fernet_key: bytes) -> bytes:
+    """Derives a 256-bit AES-GCM key from a Fernet master key using HKDF-SHA256."""
+    return HKDF(
+        algorithm=hashes.SHA256(), length=32, salt=None, info=AESGCM_KEY_INFO
+    ).derive(base64.urlsafe_b64decode(fernet_key))
+
+
+class RustFernet:
+    """
+    Adapts rfernet to the bytes-in/bytes-out interface of cryptography's Fernet.
+    rfernet works on str keys and tokens and raises its own DecryptionError,
+    which is translated to InvalidToken so callers see the same behaviour.
+    """
+
+    def __init__(self, keys: list[bytes]):
+        if len(keys) == 1:
+            self._impl = rfernet.Fernet(keys[0].decode("utf-8"))
+        else:
+            self._impl = rfernet.MultiFernet([key.decode("utf-8") for key in keys])
+
+    def encrypt(self, data: bytes) -> bytes:
+        return self._impl.encrypt(data).encode("ascii")
+
+    def decrypt(self, token: bytes) -> bytes:
+        try:
+            return self._impl.decrypt(token.decode("ascii"))
+        except (rfernet.DecryptionError, UnicodeDecodeError) as e:
+            raise InvalidToken from e
+
+
+# MultiFernet over the master keys; writes unless USE_AESGCM_WRITES is set
 cipher_suite = None
+# AES-GCM ciphers derived from the same master keys, newest first
+aead_suites = []
 
 try:
+    # Validate the master keys once; Config caches them on MASTER_ENCRYPTION_KEYS
+    Config.load_encryption_keys()
     # Initialize the MultiFernet cipher suite with keys from configuration
-    if len(Config.MASTER_ENCRYPTION_KEYS) == 1:
+    if Config.USE_RFERNET:
+        # Explicit opt-in, so the backend never depends on what happens to be installed
+        if rfernet is None:
+            logger.critical("USE_RFERNET is set but the rfernet package is not installed.")
+            raise SystemExit(
+                "Failed to initialize encryption suite: USE_RFERNET is set but rfernet is not installed."
+            )
+        cipher_suite = RustFernet(Config.MASTER_ENCRYPTION_KEYS)
+        logger.info(f"Encryption suite initialized with {len(Config.MASTER_ENCRYPTION_KEYS)} key(s) using rfernet.")
+    elif len(Config.MASTER_ENCRYPTION_KEYS) == 1:
         # Single key - use regular Fernet
         cipher_suite = Fernet(Config.MASTER_ENCRYPTION_KEYS[0])
         logger.info("Encryption suite initialized with single key.")
@@ -20,16 +82,11 @@ try:
         fernets = [Fernet(key) for key in Config.MASTER_ENCRYPTION_KEYS]
         cipher_suite = MultiFernet(fernets)
         logger.info(f"Encryption suite initialized with {len(Config.MASTER_ENCRYPTION_KEYS)} keys for rotation support.")
-except AttributeError:
-    # This happens if MASTER_ENCRYPTION_KEYS doesn't exist in Config
-    logger.critical(
-        "Encryption keys (MASTER_ENCRYPTION_KEYS) are not initialized in config."
-    )
-    raise SystemExit(
-        "Failed to initialize encryption suite: Master encryption keys are missing."
-    )
+    aead_suites = [
+        AESGCM(_derive_aesgcm_key(key)) for key in Config.MASTER_ENCRYPTION_KEYS
+    ]
 except ValueError as ve:
-    # This error occurs if any key is not a valid Fernet key
+    # load_encryption_keys raises this for a missing or invalid key
     logger.critical(f"Error initializing Fernet cipher due to invalid key(s): {ve}")
     raise SystemExit(
         f"Failed to initialize encryption suite: Invalid master key(s) ({ve})."
@@ -44,18 +101,9 @@ except Exception as e:
 
 def encrypt_secret(secret_text: str) -> bytes:
     """
-    Encrypts a text secret using MultiFernet.
-    MultiFernet always uses the first key (most recent) for encryption.
+    Encrypts a text secret. Writes Fernet tokens by default and AES-GCM tokens
+    once Config.USE_AESGCM_WRITES is enabled; decrypt_secret reads both.
     """
-    if (
-        not cipher_suite
-    ):  # Should not happen if SystemExit was raised, but as a safeguard
-        logger.critical(
-            "Attempted to use encrypt_secret but cipher_suite is not initialized."
-        )  # Changed from raise Exception
-        raise Exception(
-            "Encryption suite not initialized."
-        )  # Or handle more gracefully depending on desired behavior
     if not isinstance(secret_text, str):
         logger.error("Type error in encrypt_secret: secret_text must be a string.")
         raise TypeError("Secret to encrypt must be a string.")
@@ -63,27 +111,54 @@ def encrypt_secret(secret_text: str) -> bytes:
         logger.warning("Attempted to encrypt an empty secret.")
         raise ValueError("Secret cannot be empty.")
 
+    if Config.USE_AESGCM_WRITES:
+        return _encrypt_aesgcm(secret_text)
+
     encoded_text = secret_text.encode("utf-8")  # Encode string to bytes
-    encrypted_text = cipher_suite.encrypt(encoded_text)
-    return encrypted_text
+    try:
+        return cipher_suite.encrypt(encoded_text)
+    except AttributeError:
+        # Init failures raise SystemExit, so cipher_suite is only None if it was
+        # reset after import; checked here to keep the guard off the hot path.
+        if cipher_suite is not None:
+            raise
+        logger.critical(
+            "Attempted to use encrypt_secret but cipher_suite is not initialized."
+        )
+        raise Exception("Encryption suite not initialized.")
 
 
-def decrypt_secret(encrypted_token: bytes) -> str | None:
+def _encrypt_aesgcm(secret_text: str) -> bytes:
     """
-    Decrypts an encrypted token back to text using MultiFernet.
-    MultiFernet will try each key in order until one successfully decrypts the data.
-    Returns None if decryption fails with all available keys.
+    Encrypts with AES-GCM under a key derived from the newest master key.
+    The token is version || nonce || ciphertext || tag.
     """
-    if not cipher_suite:  # Safeguard
+    nonce = os.urandom(AESGCM_NONCE_SIZE)
+    try:
+        return AESGCM_TOKEN_VERSION + nonce + aead_suites[0].encrypt(
+            nonce, secret_text.encode("utf-8"), None
+        )
+    except IndexError:
         logger.critical(
-            "CRITICAL: Decryption attempted but encryption suite is not initialized."
+            "Attempted to use encrypt_secret but AES-GCM suite is not initialized."
         )
-        return None  # Or raise a more specific internal server error if this path is reachable
+        raise Exception("Encryption suite not initialized.")
 
+
+def decrypt_secret(encrypted_token: bytes) -> str | None:
+    """
+    Decrypts an encrypted token back to text.
+    AES-GCM tokens are recognised by their version byte; anything else is a Fernet
+    token and is tried with each key in order.
+    Returns None if decryption fails with all available keys.
+    """
     if not isinstance(encrypted_token, bytes):
         logger.error("Error: Encrypted token for decryption must be bytes.")
         raise TypeError("Encrypted token must be bytes.")
 
+    if encrypted_token[:1] == AESGCM_TOKEN_VERSION:
+        return _decrypt_aesgcm(encrypted_token)
+
     try:
         decrypted_text_bytes = cipher_suite.decrypt(encrypted_token)
         return decrypted_text_bytes.decode("utf-8")  # Decode bytes back to string
@@ -96,8 +171,38 @@ def decrypt_secret(encrypted_token: bytes) -> str | None:
         )
         return None
     except Exception as e:
+        if cipher_suite is None:  # Safeguard, checked only on the failure path
+            logger.critical(
+                "CRITICAL: Decryption attempted but encryption suite is not initialized."
+            )
+            return None
         # Catch any other potential decryption errors (e.g., issues not covered by InvalidToken)
         logger.error(
             f"An unexpected error occurred during decryption: {e}", exc_info=True
         )  # Add exc_info for traceback
         return None
+
+
+def _decrypt_aesgcm(encrypted_token: bytes) -> str | None:
+    """
+    Decrypts an AES-GCM token produced by _encrypt_aesgcm.
+    Each derived key is tried in order, mirroring MultiFernet's rotation behaviour.
+    """
+    nonce_end = len(AESGCM_TOKEN_VERSION) + AESGCM_NONCE_SIZE
+    nonce = encrypted_token[len(AESGCM_TOKEN_VERSION):nonce_end]
+    ciphertext = encrypted_token[nonce_end:]
+    for aead in aead_suites:
+        try:
+            return aead.decrypt(nonce, ciphertext, None).decode("utf-8")
+        except (InvalidTag, ValueError):
+            continue
+
+    if not aead_suites:  # Safeguard, checked only on the failure path
+        logger.critical(
+            "CRITICAL: Decryption attempted but AES-GCM suite is not initialized."
+        )
+        return None
+    logger.warning(
+        "Decryption failed: Invalid token or no valid key found. This could indicate tampering, corruption, or an expired link."
+    )
+    return None
@@ -1,4 +1,10 @@
 # backend/app/main.py
+import base64
+import json
+import random
+import secrets
+import time
+
 from flask import Flask, request, jsonify, current_app
 from flask_cors import CORS
 
@@ -76,11 +82,15 @@ def share_secret_api():
         data_to_store = payload
         current_app.logger.info("Storing secret with server-side encryption")
 
-    # Basic input validation: length check
-    if len(data_to_store.encode("utf-8")) > current_app.config["MAX_SECRET_LENGTH_BYTES"]:
+    # Basic input validation: length check. UTF-8 uses 1-4 bytes per character, so
+    # only text between max/4 and max characters needs encoding to be measured.
+    max_bytes = current_app.config["MAX_SECRET_LENGTH_BYTES"]
+    if len(data_to_store) > max_bytes or (
+        len(data_to_store) * 4 > max_bytes and len(data_to_store.encode("utf-8")) > max_bytes
+    ):
         return jsonify(
             {
-                "error": f"Secret exceeds maximum length of {current_app.config['MAX_SECRET_LENGTH_BYTES'] // 1024}KB"
+                "error": f"Secret exceeds maximum length of {max_bytes // 1024}KB"
             }
         ), 413
 
@@ -95,7 +105,7 @@ def share_secret_api():
                 e2ee_data=e2ee_data
             )
         else:
-            # Apply server-side encryption
+            # Apply server-side encryption (Fernet, or AES-GCM with USE_AESGCM_WRITES)
             processed_data = encrypt_secret(data_to_store)
             link_id = store_encrypted_secret(
                 processed_data, 
@@ -133,14 +143,17 @@ def retrieve_secret_api(link_id):
             404,
         )
 
+    if request.method == "HEAD":
+        # Flask routes HEAD through this GET view. Existence is never revealed
+        # (anti-enumeration), so answer without a lookup; this also keeps link
+        # previews that probe with HEAD from consuming one-time secrets.
+        return "", 200
+
     def pad_response_data(response_data: dict) -> dict:
         """
         Pad response data to a consistent size to prevent enumeration attacks.
         Uses the maximum secret length as reference for padding calculations.
         """
-        import json
-        import secrets
-        
         # Calculate current response size
         current_size = len(json.dumps(response_data, separators=(',', ':')).encode('utf-8'))
         
@@ -160,6 +173,12 @@ def retrieve_secret_api(link_id):
 
     secret_obj = retrieve_secret(link_id)
 
+    # Deleting is the claim on a one-time secret: of several concurrent readers only
+    # one delete succeeds, so only that request may return it. The others get dummy data.
+    if secret_obj and not delete_secret(link_id):
+        current_app.logger.warning(f"Secret {link_id} retrieved but could not be deleted; withholding it.")
+        secret_obj = None
+
     if secret_obj:
         if secret_obj.is_e2ee:
             # E2EE secret - return encrypted payload and salt/nonce for client-side decryption
@@ -171,25 +190,16 @@ def retrieve_secret_api(link_id):
                     "nonce": secret_obj.e2ee_data["nonce"]
                 }
             }
-            
-            # Delete the secret immediately (one-time access for E2EE too)
-            if delete_secret(link_id):
-                current_app.logger.info(f"E2EE secret {link_id} retrieved and deleted (one-time access).")
-            else:
-                current_app.logger.warning(f"E2EE secret {link_id} retrieved but failed to delete.")
+            current_app.logger.info(f"E2EE secret {link_id} retrieved and deleted (one-time access).")
             
             # Pad response to consistent size
             padded_response = pad_response_data(response_data)
             return jsonify(padded_response), 200
         else:
-            # Traditional secret - decrypt on server and delete immediately for one-time access
+            # Traditional secret - already deleted above, decrypt on server
             decrypted_secret = decrypt_secret(secret_obj.encrypted_secret)
             if decrypted_secret is not None:
-                # Successfully decrypted - delete the secret now
-                if delete_secret(link_id):
-                    current_app.logger.info(f"Traditional secret {link_id} retrieved, decrypted, and deleted.")
-                else:
-                    current_app.logger.warning(f"Traditional secret {link_id} decrypted but failed to delete.")
+                current_app.logger.info(f"Traditional secret {link_id} retrieved, decrypted, and deleted.")
                 
                 response_data = {
                     "mime": secret_obj.mime_type,
@@ -200,8 +210,7 @@ def retrieve_secret_api(link_id):
                 padded_response = pad_response_data(response_data)
                 return jsonify(padded_response), 200
             else:
-                # Decryption failed - delete the corrupted secret anyway
-                delete_secret(link_id)
+                # Decryption failed - the corrupted secret was deleted above
                 current_app.logger.error(
                     f"Failed to decrypt secret for link_id: {link_id}. Secret deleted due to corruption."
                 )
@@ -210,11 +219,6 @@ def retrieve_secret_api(link_id):
                 return jsonify(padded_response), 200
     else:
         # Secret not found - return dummy E2EE data to prevent enumeration attacks
-        import secrets
-        import base64
-        import time
-        import random
-        
         # Add random delay (5-25ms) to simulate Cosmos DB interaction and prevent timing attacks
         delay_ms = random.uniform(5, 25)
         time.sleep(delay_ms / 1000.0)  # Convert to seconds
@@ -245,10 +249,18 @@ def retrieve_secret_api(link_id):
         return jsonify(padded_dummy_response), 200
 
 
+# Serialized once; Flask builds a fresh Response from the body on each request
+_HEALTH_RESPONSE = (
+    json.dumps({"status": "healthy", "message": "Backend is running."}),
+    200,
+    {"Content-Type": "application/json"},
+)
+
+
 @app.route("/health", methods=["GET"])
 def health_check():
     """Basic health check endpoint for monitoring."""
-    return jsonify({"status": "healthy", "message": "Backend is running."}), 200
+    return _HEALTH_RESPONSE
 
 
 # This block allows running the app directly with `python backend/app/main.py`
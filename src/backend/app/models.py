@@ -12,7 +12,7 @@ class Secret:
 
     def __init__(self, link_id: str, encrypted_secret: bytes, is_e2ee: bool = False, 
                  mime_type: str = "text/plain", e2ee_data: Optional[Dict[str, Any]] = None, 
-                 created_at: Optional[datetime] = None):
+                 created_at: Optional[datetime] = None, ttl: Optional[int] = None):
         self.id = link_id  # Use link_id as the document id for direct access
         self.link_id = link_id
         self.encrypted_secret = encrypted_secret
@@ -20,6 +20,7 @@ class Secret:
         self.mime_type = mime_type
         self.e2ee_data = e2ee_data  # Store the full e2ee object for E2EE secrets
         self.created_at = created_at or datetime.now(timezone.utc)
+        self.ttl = ttl  # Seconds until Cosmos DB expires the document; None uses the container default
 
     def to_dict(self) -> Dict[str, Any]:
         """Convert the Secret object to a dictionary for Cosmos DB storage."""
@@ -30,9 +31,12 @@ class Secret:
             'is_e2ee': self.is_e2ee,
             'mime_type': self.mime_type,
             'created_at': self.created_at.isoformat(),
-            # TTL is handled by the container configuration (24 hours default)
         }
         
+        # Per-document TTL overrides the container's defaultTtl
+        if self.ttl is not None:
+            result['ttl'] = self.ttl
+        
         # Only include e2ee_data if it exists (for E2EE secrets)
         if self.e2ee_data:
             result['e2ee_data'] = self.e2ee_data
@@ -51,7 +55,8 @@ class Secret:
             is_e2ee=data.get('is_e2ee', False),
             mime_type=data.get('mime_type', 'text/plain'),
             e2ee_data=data.get('e2ee_data'),
-            created_at=created_at
+            created_at=created_at,
+            ttl=data.get('ttl'),
         )
 
     def __repr__(self):
@@ -1,4 +1,7 @@
 # backend/app/storage.py
+import base64
+import os
+import re
 import uuid
 import logging
 from typing import Optional
@@ -6,11 +9,18 @@ from typing import Optional
 # Import the get_container function
 from . import get_cosmos_container
 from .models import Secret
+from .config import Config
 from azure.cosmos.exceptions import CosmosResourceNotFoundError
 
 # Initialize logger for this module
 logger = logging.getLogger(__name__)
 
+# Link ids are 16 random bytes as unpadded URL-safe base64: 21 free characters
+# plus a last one that only carries 2 bits. Legacy ids are canonical UUID strings.
+_LINK_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]{21}[AQgw]")
+_LINK_ID_LENGTH = 22
+_LEGACY_LINK_ID_LENGTH = 36
+
 def get_container():
     """Get the initialized Cosmos DB container"""
     container = get_cosmos_container()
@@ -20,8 +30,30 @@ def get_container():
 
 
 def generate_unique_link_id() -> str:
-    """Generates a cryptographically strong unique ID for the secret link."""
-    return str(uuid.uuid4())
+    """
+    Generates a cryptographically strong unique ID for the secret link.
+    128 random bits as 22 URL-safe characters, without building a UUID object.
+    """
+    return base64.urlsafe_b64encode(os.urandom(16)).rstrip(b"=").decode("ascii")
+
+
+def is_valid_link_id(link_id: str) -> bool:
+    """
+    Checks that link_id has a form issued by generate_unique_link_id, or the
+    canonical UUID form used before, so older links keep working until their TTL.
+    Lets lookups for malformed IDs return early without a Cosmos DB round-trip.
+    """
+    if not isinstance(link_id, str):
+        return False
+    # Cheap length check first; anything else is rejected without parsing
+    if len(link_id) == _LINK_ID_LENGTH:
+        return _LINK_ID_PATTERN.fullmatch(link_id) is not None
+    if len(link_id) != _LEGACY_LINK_ID_LENGTH:
+        return False
+    try:
+        return str(uuid.UUID(link_id)) == link_id
+    except ValueError:
+        return False
 
 
 def store_encrypted_secret(encrypted_secret_data: bytes, is_e2ee: bool = False, 
@@ -47,6 +79,7 @@ def store_encrypted_secret(encrypted_secret_data: bytes, is_e2ee: bool = False,
         is_e2ee=is_e2ee,
         mime_type=mime_type,
         e2ee_data=e2ee_data,
+        ttl=Config.SECRET_TTL_SECONDS,
     )
 
     try:
@@ -70,6 +103,10 @@ def retrieve_secret(link_id: str) -> Secret | None:
             f"Attempt to retrieve secret with invalid link_id type or empty: {link_id}"        )
         return None
 
+    if not is_valid_link_id(link_id):
+        logger.info(f"Secret with malformed link_id: {link_id!r} cannot exist; skipping lookup.")
+        return None
+
     container = get_container()
     if not container:
         logger.error("Cosmos DB container not initialized")
@@ -106,6 +143,10 @@ def delete_secret(link_id: str) -> bool:
         )
         return False
 
+    if not is_valid_link_id(link_id):
+        logger.info(f"Secret with malformed link_id: {link_id!r} cannot exist; skipping delete.")
+        return False
+
     container = get_container()
     if not container:
         logger.error("Cosmos DB container not initialized")
@@ -138,11 +179,13 @@ def retrieve_and_delete_secret(link_id: str) -> Secret | None:
     secret_obj = retrieve_secret(link_id)
     
     if secret_obj and not secret_obj.is_e2ee:
-        # Traditional secret - delete immediately for one-time access
-        if delete_secret(link_id):
-            logger.info(f"Traditional secret {link_id} retrieved and deleted for one-time access.")
-        else:
-            logger.warning(f"Failed to delete traditional secret {link_id} after retrieval.")
+        # Traditional secret - delete immediately for one-time access. Only the
+        # caller whose delete succeeds gets the secret, so concurrent readers
+        # cannot both receive it.
+        if not delete_secret(link_id):
+            logger.warning(f"Failed to delete traditional secret {link_id} after retrieval; withholding it.")
+            return None
+        logger.info(f"Traditional secret {link_id} retrieved and deleted for one-time access.")
     elif secret_obj and secret_obj.is_e2ee:
         # E2EE secret - don't auto-delete, let caller handle it
         logger.info(f"E2EE secret {link_id} retrieved (not auto-deleted).")
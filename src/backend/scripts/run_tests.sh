@@ -9,7 +9,7 @@ echo "Running comprehensive test suite with coverage measurement..."
 echo "==========================================================="
 
 # Run pytest with coverage
-python -m pytest tests/ -v \
+python -m pytest tests/ -v -n auto --dist loadgroup \
   --cov=app \
   --cov-report=term-missing \
   --cov-report=xml:coverage.xml \
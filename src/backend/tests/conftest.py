@@ -1,159 +1,277 @@
 # backend/tests/conftest.py
-import sys
 import os
 
 import pytest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch
+from azure.cosmos.exceptions import CosmosResourceNotFoundError
 from cryptography.fernet import Fernet
 
-# Add the current directory to the Python path so we can import app modules
-backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-if backend_dir not in sys.path:
-    sys.path.insert(0, backend_dir)
-
 # Set up test environment variables before importing the app
 # Generate two keys for MultiFernet testing
 current_key = Fernet.generate_key().decode()
 previous_key = Fernet.generate_key().decode()
 
-os.environ['MASTER_ENCRYPTION_KEY'] = current_key
-os.environ['MASTER_ENCRYPTION_KEY_PREVIOUS'] = previous_key
-os.environ['FLASK_DEBUG'] = 'False'
-os.environ['MAX_SECRET_LENGTH_KB'] = '100'
-os.environ['SECRET_EXPIRY_MINUTES'] = '60'
-os.environ['COSMOS_ENDPOINT'] = 'https://localhost:8081'
-os.environ['COSMOS_KEY'] = 'C2y6yDjf5/R+ob0N8A7Cgv30VRDJIWEHLM+4QDU5DE2nQ9nDuVTqobD4b8mGGyPMbIZnqyMsEcaGQy67XIw/Jw=='
-os.environ['COSMOS_DATABASE_NAME'] = 'TestTransio'
-os.environ['COSMOS_CONTAINER_NAME'] = 'test_secrets'
+# Test modules import app.* during collection, before any fixture runs, so the
+# variables are set here and restored in pytest_unconfigure
+_env = pytest.MonkeyPatch()
+_env.setenv('MASTER_ENCRYPTION_KEY', current_key)
+_env.setenv('MASTER_ENCRYPTION_KEY_PREVIOUS', previous_key)
+_env.setenv('FLASK_DEBUG', 'False')
+_env.setenv('MAX_SECRET_LENGTH_KB', '100')
+_env.setenv('SECRET_EXPIRY_MINUTES', '60')
+_env.setenv('COSMOS_ENDPOINT', 'https://localhost:8081')
+_env.setenv('COSMOS_KEY', 'C2y6yDjf5/R+ob0N8A7Cgv30VRDJIWEHLM+4QDU5DE2nQ9nDuVTqobD4b8mGGyPMbIZnqyMsEcaGQy67XIw/Jw==')
+# One database name per xdist worker so parallel runs never share state
+_env.setenv('COSMOS_DATABASE_NAME', f"TestTransio_{os.environ.get('PYTEST_XDIST_WORKER', 'gw0')}")
+_env.setenv('COSMOS_CONTAINER_NAME', 'test_secrets')
 
 
-@pytest.fixture
-def mock_cosmos_container():
-    """Mock Cosmos DB container for testing."""
-    container = MagicMock()
-    
-    # Mock storage for in-memory testing
-    _storage = {}
-    
-    def mock_create_item(body):
-        _storage[body['id']] = body
+def pytest_unconfigure(config):
+    """Restore the process environment once the session is over."""
+    _env.undo()
+
+
+# Sentinel for single-lookup dict access in FakeContainer
+_MISSING = object()
+
+
+class FakeContainer:
+    """In-memory stand-in for a Cosmos DB container with plain call counters.
+
+    Assign an exception to ``errors['<method name>']`` to make that call fail.
+    """
+
+    def __init__(self):
+        self.items = {}
+        self.errors = {}
+        self.reset()
+
+    def reset(self):
+        """Drop all items, injected errors and counters."""
+        self.items.clear()
+        self.errors.clear()
+        self.creates = self.reads = self.deletes = self.queries = 0
+
+    def _maybe_fail(self, operation):
+        error = self.errors.get(operation)
+        if error is not None:
+            raise error
+
+    def create_item(self, body, **kwargs):
+        self.creates += 1
+        self._maybe_fail('create_item')
+        self.items[body['id']] = body
         return body
-    
-    def mock_read_item(item, partition_key):
-        if item in _storage:
-            return _storage[item]
-        from azure.cosmos.exceptions import CosmosResourceNotFoundError
-        raise CosmosResourceNotFoundError(message=f"Item {item} not found")
-    
-    def mock_delete_item(item, partition_key):
-        if item in _storage:
-            del _storage[item]
-        else:
-            from azure.cosmos.exceptions import CosmosResourceNotFoundError
+
+    def read_item(self, item, partition_key, **kwargs):
+        self.reads += 1
+        self._maybe_fail('read_item')
+        document = self.items.get(item, _MISSING)
+        if document is _MISSING:
             raise CosmosResourceNotFoundError(message=f"Item {item} not found")
+        return document
+
+    def delete_item(self, item, partition_key, **kwargs):
+        self.deletes += 1
+        self._maybe_fail('delete_item')
+        if self.items.pop(item, _MISSING) is _MISSING:
+            raise CosmosResourceNotFoundError(message=f"Item {item} not found")
+
+    def query_items(self, query, enable_cross_partition_query=False, **kwargs):
+        # Lazy like the SDK's ItemPaged; callers materialize only if they need to
+        self.queries += 1
+        self._maybe_fail('query_items')
+        return iter(self.items.values())
+
+
+@pytest.fixture(scope="session")
+def _session_container():
+    """Build one in-memory container for the whole test session."""
+    return FakeContainer()
+
+
+@pytest.fixture
+def mock_cosmos_container(_session_container):
+    """Mock Cosmos DB container for testing, emptied before every test."""
+    _session_container.reset()
+    return _session_container
+
+
+@pytest.fixture(scope="session")
+def flask_app():
+    """Import and configure the Flask application once per test session."""
+    # Cosmos DB initialization runs at import time, so it must be mocked here
+    with patch('app.init_cosmos_db', return_value=True):
+        from app.main import app as flask_app
     
-    def mock_query_items(query, enable_cross_partition_query=False):
-        # Simple query implementation for testing
-        return list(_storage.values())
-    
-    container.create_item = MagicMock(side_effect=mock_create_item)
-    container.read_item = MagicMock(side_effect=mock_read_item)
-    container.delete_item = MagicMock(side_effect=mock_delete_item)
-    container.query_items = MagicMock(side_effect=mock_query_items)
+    # Configure for testing
+    flask_app.config['TESTING'] = True
+    flask_app.config['WTF_CSRF_ENABLED'] = False
+    flask_app.config['MAX_SECRET_LENGTH_BYTES'] = 100 * 1024
     
-    return container
+    # Push the application context once for the whole session
+    ctx = flask_app.app_context()
+    ctx.push()
+    yield flask_app
+    ctx.pop()
+
+
+@pytest.fixture(scope="session")
+def main_module(flask_app):
+    """Provide the app.main module, which flask_app imported with Cosmos DB mocked."""
+    from app import main
+    return main
+
+
+@pytest.fixture(scope="session")
+def _bound_app(flask_app, _session_container):
+    """Bind the session's container where get_cosmos_container() looks it up, once."""
+    with patch.object(flask_app, 'cosmos_container', _session_container, create=True):
+        yield flask_app
 
 
 @pytest.fixture
-def app(mock_cosmos_container):
-    """Create a test Flask application using the actual app structure."""
-    # Mock Cosmos DB functions before importing app modules
-    with patch('app.get_cosmos_container', return_value=mock_cosmos_container), \
-         patch('app.storage.get_cosmos_container', return_value=mock_cosmos_container), \
-         patch('app.storage.get_container', return_value=mock_cosmos_container), \
-         patch('app.init_cosmos_db', return_value=True):
-        
-        # Import the actual main app
-        from app.main import app as flask_app
-        
-        # Configure for testing
-        flask_app.config['TESTING'] = True
-        flask_app.config['WTF_CSRF_ENABLED'] = False
-        flask_app.config['MAX_SECRET_LENGTH_BYTES'] = 100 * 1024
-        
-        with flask_app.app_context():
-            yield flask_app
+def app(_bound_app, mock_cosmos_container):
+    """Provide the test Flask application backed by an empty mock container."""
+    # The container stays bound for the session; resetting it per test plays the
+    # role of a rolled-back transaction.
+    return _bound_app
+
+
+@pytest.fixture(scope="session")
+def session_client(flask_app):
+    """Create one test client for the session; the app sets no cookies to leak."""
+    return flask_app.test_client()
 
 
 @pytest.fixture
-def client(app):
-    """Create a test client for the Flask application."""
-    return app.test_client()
+def client(app, session_client):
+    """Provide the shared test client with an empty mock container bound."""
+    return session_client
+
+
+@pytest.fixture(scope="class")
+def ro_client(_bound_app, _session_container, session_client):
+    """Provide the shared test client with the container emptied once per class.
+
+    Only for tests that never store secrets, so nothing leaks between them.
+    """
+    _session_container.reset()
+    return session_client
 
 
 @pytest.fixture
-def app_context(mock_cosmos_container):
-    """Provide application context for tests that need it."""
-    # Mock Cosmos DB functions before importing app modules
-    with patch('app.get_cosmos_container', return_value=mock_cosmos_container), \
-         patch('app.storage.get_cosmos_container', return_value=mock_cosmos_container), \
-         patch('app.storage.get_container', return_value=mock_cosmos_container), \
-         patch('app.init_cosmos_db', return_value=True):
-        
-        # Import the actual main app
-        from app.main import app as flask_app
-        
-        # Configure for testing
-        flask_app.config['TESTING'] = True
-        
-        with flask_app.app_context():
-            yield flask_app
+def app_context(app):
+    """Push a fresh application context on the session app, so ``g`` starts empty."""
+    with app.app_context():
+        yield app
 
 
 @pytest.fixture
+def created_secret(request, client):
+    """Store the parametrized payload through the API and return (link_id, payload)."""
+    payload = request.param
+    response = client.post('/api/share', json={"payload": payload})
+    assert response.status_code == 201
+    return response.get_json()['link_id'], payload
+
+
+@pytest.fixture
+def shared_secret_link(client):
+    """Store the 'shared-test' secret through the API and return (response, link_id)."""
+    response = client.post('/api/share', json={"payload": "shared-test"})
+    return response, response.get_json()['link_id']
+
+
+@pytest.fixture(scope="session")
+def seeded_secret_document():
+    """Build the Cosmos document for the 'seed' secret once per session."""
+    from app.encryption import encrypt_secret
+    from app.models import Secret
+    return Secret(
+        link_id="5eed5eed-0000-4000-8000-000000000000",
+        encrypted_secret=encrypt_secret("seed"),
+    ).to_dict()
+
+
+@pytest.fixture
+def seeded_secret(app, mock_cosmos_container, seeded_secret_document):
+    """Insert the pre-built 'seed' secret into the test's container and return (link_id, payload)."""
+    mock_cosmos_container.create_item(body=dict(seeded_secret_document))
+    return seeded_secret_document['id'], "seed"
+
+
+@pytest.fixture(scope="session")
 def sample_secret():
     """Provide a sample secret for testing."""
     return "This is a test secret message"
 
 
+@pytest.fixture(scope="session")
+def unicode_secret():
+    """Provide a sample secret with non-ASCII characters for testing."""
+    return "🔒 This is a test with unicode characters! 🚀"
+
+
+@pytest.fixture(scope="session")
+def fernet_key():
+    """Provide the session's primary master key, generated once at import."""
+    return current_key.encode()
+
+
+@pytest.fixture(scope="session")
+def previous_fernet_key():
+    """Provide the session's previous master key, generated once at import."""
+    return previous_key.encode()
+
+
+@pytest.fixture(scope="session")
+def session_cipher(fernet_key):
+    """Provide a Fernet instance for the primary master key."""
+    return Fernet(fernet_key)
+
+
+@pytest.fixture(scope="session")
+def encrypted_sample(sample_secret):
+    """Encrypt sample_secret once per session for decrypt-only tests."""
+    from app.encryption import encrypt_secret
+    return encrypt_secret(sample_secret)
+
+
+@pytest.fixture(scope="session")
+def encrypted_unicode(unicode_secret):
+    """Encrypt unicode_secret once per session for decrypt-only tests."""
+    from app.encryption import encrypt_secret
+    return encrypt_secret(unicode_secret)
+
+
 @pytest.fixture
-def single_key_environment():
+def single_key_environment(monkeypatch):
     """Set up environment with only current key for testing backward compatibility."""
-    with patch.dict(os.environ, {
-        'MASTER_ENCRYPTION_KEY': Fernet.generate_key().decode()
-    }, clear=False):
-        # Remove previous key if it exists
-        if 'MASTER_ENCRYPTION_KEY_PREVIOUS' in os.environ:
-            del os.environ['MASTER_ENCRYPTION_KEY_PREVIOUS']
-        yield
+    monkeypatch.setenv('MASTER_ENCRYPTION_KEY', current_key)
+    monkeypatch.delenv('MASTER_ENCRYPTION_KEY_PREVIOUS', raising=False)
 
 
 @pytest.fixture
-def key_rotation_environment():
+def key_rotation_environment(monkeypatch):
     """Set up environment with both current and previous keys for testing key rotation."""
-    current_key = Fernet.generate_key().decode()
-    previous_key = Fernet.generate_key().decode()
-    
-    with patch.dict(os.environ, {
-        'MASTER_ENCRYPTION_KEY': current_key,
-        'MASTER_ENCRYPTION_KEY_PREVIOUS': previous_key
-    }, clear=False):
-        yield {
-            'current': current_key,
-            'previous': previous_key
-        }
+    monkeypatch.setenv('MASTER_ENCRYPTION_KEY', current_key)
+    monkeypatch.setenv('MASTER_ENCRYPTION_KEY_PREVIOUS', previous_key)
+    return {
+        'current': current_key,
+        'previous': previous_key
+    }
 
 
-@pytest.fixture
-def encrypted_secret_bytes():
-    """Provide sample encrypted secret bytes for testing."""
-    from app.encryption import encrypt_secret
-    return encrypt_secret("This is a test secret")
+@pytest.fixture(scope="session")
+def encrypted_secret_bytes(session_cipher):
+    """Fernet token for a sample secret, built directly with session_cipher."""
+    return session_cipher.encrypt(b"This is a test secret")
 
 
 @pytest.fixture
-def mock_cosmos_session(mock_cosmos_container):
+def mock_cosmos_session(app, mock_cosmos_container):
     """Mock Cosmos DB session for testing storage functions."""
-    with patch('app.storage.get_cosmos_container', return_value=mock_cosmos_container), \
-         patch('app.storage.get_container', return_value=mock_cosmos_container):
-        yield mock_cosmos_container
\ No newline at end of file
+    # The container is bound to the app once per session, so storage finds it
+    # through get_cosmos_container() without patching anything per test
+    return mock_cosmos_container
\ No newline at end of file
@@ -1,11 +1,56 @@
 # backend/tests/test_encryption.py
+import importlib
+import re
 import pytest
-import sys
-from unittest.mock import patch
+from unittest.mock import patch, MagicMock
 from cryptography.fernet import InvalidToken
 
 from app.encryption import encrypt_secret, decrypt_secret
 
+# Error-message contract of app.encryption, compiled once for pytest.raises(match=...)
+_MSG_NON_STRING = re.compile("Secret to encrypt must be a string")
+_MSG_NON_BYTES = re.compile("Encrypted token must be bytes")
+_MSG_EMPTY = re.compile("Secret cannot be empty")
+_MSG_NOT_INITIALIZED = re.compile("Encryption suite not initialized")
+
+# Round-trip payloads, built once at import. The sized payloads pin the
+# exact lengths exercised (64 bytes and 1 KiB of plaintext) instead of an
+# arbitrary 1011-character string.
+ROUNDTRIP_SECRETS = (
+    "x",
+    "Simple test",
+    "Multi\nline\ntext",
+    "Special chars: !@#$%^&*()",
+    "Unicode: 🔒🚀🎯",
+    "x" * 64,
+    "x" * 1024,
+)
+ROUNDTRIP_IDS = (
+    "single-char", "simple", "multiline", "special", "unicode", "64-bytes", "1024-bytes",
+)
+
+
+@pytest.fixture
+def broken_cipher(monkeypatch, request):
+    """Replace the cipher suite with a mock whose decrypt raises request.param."""
+    mock = MagicMock()
+    mock.decrypt.side_effect = request.param
+    monkeypatch.setattr("app.encryption.cipher_suite", mock)
+    return mock
+
+
+@pytest.fixture
+def aesgcm_writes(monkeypatch):
+    """Turn on AES-GCM writes (Config.USE_AESGCM_WRITES) for one test."""
+    monkeypatch.setattr("app.encryption.Config.USE_AESGCM_WRITES", True)
+
+
+@pytest.fixture(params=[False, True], ids=["fernet-writes", "aesgcm-writes"])
+def write_format(monkeypatch, request):
+    """Run a test once per setting of Config.USE_AESGCM_WRITES."""
+    monkeypatch.setattr("app.encryption.Config.USE_AESGCM_WRITES", request.param)
+    return request.param
+
 
 class TestEncryptSecret:
     """Test cases for the encrypt_secret function."""
@@ -17,25 +62,41 @@ class TestEncryptSecret:
         assert isinstance(result, bytes)
         assert len(result) > 0
 
+    def test_encrypt_secret_uses_primary_key(self, session_cipher, sample_secret):
+        """Test that by default new tokens are Fernet tokens under the current (first) master key."""
+        token = encrypt_secret(sample_secret)
+
+        assert session_cipher.decrypt(token) == sample_secret.encode("utf-8")
+
+    def test_encrypt_secret_aesgcm_writes(self, aesgcm_writes, fernet_key, sample_secret):
+        """Test that USE_AESGCM_WRITES produces AES-GCM tokens under the current master key."""
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+        from app import encryption
+
+        token = encrypt_secret(sample_secret)
+        nonce_end = 1 + encryption.AESGCM_NONCE_SIZE
+        aead = AESGCM(encryption._derive_aesgcm_key(fernet_key))
+
+        assert token[:1] == encryption.AESGCM_TOKEN_VERSION
+        assert aead.decrypt(token[1:nonce_end], token[nonce_end:], None) == sample_secret.encode("utf-8")
+
     def test_encrypt_secret_empty_string(self):
         """Test that empty string raises ValueError."""
-        with pytest.raises(ValueError, match="Secret cannot be empty"):
+        with pytest.raises(ValueError, match=_MSG_EMPTY):
             encrypt_secret("")
 
-    def test_encrypt_secret_non_string_input(self):
+    @pytest.mark.parametrize(
+        "bad",
+        [123, None, ["test"], 3.14, b"bytes", {"k": "v"}],
+        ids=["int", "none", "list", "float", "bytes", "dict"],
+    )
+    def test_encrypt_secret_non_string_input(self, bad):
         """Test that non-string input raises TypeError."""
-        with pytest.raises(TypeError, match="Secret to encrypt must be a string"):
-            encrypt_secret(123)
-
-        with pytest.raises(TypeError, match="Secret to encrypt must be a string"):
-            encrypt_secret(None)
+        with pytest.raises(TypeError, match=_MSG_NON_STRING):
+            encrypt_secret(bad)
 
-        with pytest.raises(TypeError, match="Secret to encrypt must be a string"):
-            encrypt_secret(["test"])
-
-    def test_encrypt_secret_unicode_content(self):
+    def test_encrypt_secret_unicode_content(self, unicode_secret):
         """Test encryption of unicode content."""
-        unicode_secret = "🔒 This is a test with unicode characters! 🚀"
         result = encrypt_secret(unicode_secret)
 
         assert isinstance(result, bytes)
@@ -44,93 +105,114 @@ class TestEncryptSecret:
     @patch("app.encryption.cipher_suite", None)
     def test_encrypt_secret_no_cipher_suite(self, sample_secret):
         """Test encryption failure when cipher_suite is not initialized."""
-        with pytest.raises(Exception, match="Encryption suite not initialized"):
+        with pytest.raises(Exception, match=_MSG_NOT_INITIALIZED):
+            encrypt_secret(sample_secret)
+
+    @patch("app.encryption.aead_suites", [])
+    def test_encrypt_secret_no_aead_suite(self, aesgcm_writes, sample_secret):
+        """Test AES-GCM encryption failure when the suite is not initialized."""
+        with pytest.raises(Exception, match=_MSG_NOT_INITIALIZED):
             encrypt_secret(sample_secret)
 
 
 class TestDecryptSecret:
     """Test cases for the decrypt_secret function."""
 
-    def test_decrypt_secret_success(self, sample_secret):
+    def test_decrypt_secret_success(self, sample_secret, encrypted_sample):
         """Test successful decryption of a valid encrypted secret."""
-        encrypted = encrypt_secret(sample_secret)
-        result = decrypt_secret(encrypted)
+        result = decrypt_secret(encrypted_sample)
 
         assert result == sample_secret
 
-    def test_decrypt_secret_invalid_token(self):
+    @pytest.mark.parametrize(
+        "invalid_token",
+        [b"invalid_encrypted_data", b"", b"\x02invalid_encrypted_data"],
+        ids=["fernet", "empty", "aesgcm"],
+    )
+    def test_decrypt_secret_invalid_token(self, invalid_token):
         """Test decryption with invalid token returns None."""
-        invalid_token = b"invalid_encrypted_data"
-        result = decrypt_secret(invalid_token)
-
-        assert result is None
+        assert decrypt_secret(invalid_token) is None
 
     def test_decrypt_secret_non_bytes_input(self):
         """Test that non-bytes input raises TypeError."""
-        with pytest.raises(TypeError, match="Encrypted token must be bytes"):
+        with pytest.raises(TypeError, match=_MSG_NON_BYTES):
             decrypt_secret("not_bytes")
 
-        with pytest.raises(TypeError, match="Encrypted token must be bytes"):
+        with pytest.raises(TypeError, match=_MSG_NON_BYTES):
             decrypt_secret(123)
 
-    def test_decrypt_secret_unicode_roundtrip(self):
-        """Test encryption and decryption of unicode content."""
-        unicode_secret = "🔒 This is a test with unicode characters! 🚀"
-        encrypted = encrypt_secret(unicode_secret)
-        result = decrypt_secret(encrypted)
+    def test_decrypt_secret_unicode_roundtrip(self, unicode_secret, encrypted_unicode):
+        """Test decryption of unicode content."""
+        result = decrypt_secret(encrypted_unicode)
 
         assert result == unicode_secret
 
     @patch("app.encryption.cipher_suite", None)
     def test_decrypt_secret_no_cipher_suite(self, encrypted_secret_bytes):
-        """Test decryption failure when cipher_suite is not initialized."""
+        """Test Fernet decryption failure when cipher_suite is not initialized."""
         result = decrypt_secret(encrypted_secret_bytes)
 
         assert result is None
 
-    @patch("app.encryption.cipher_suite")
-    def test_decrypt_secret_invalid_token_exception(self, mock_cipher):
-        """Test handling of InvalidToken exception."""
-        mock_cipher.decrypt.side_effect = InvalidToken()
+    def test_decrypt_secret_no_aead_suite(self, aesgcm_writes, sample_secret):
+        """Test AES-GCM decryption failure when the suite is not initialized."""
+        token = encrypt_secret(sample_secret)
+        with patch("app.encryption.aead_suites", []):
+            assert decrypt_secret(token) is None
 
-        result = decrypt_secret(b"some_encrypted_data")
+    def test_decrypt_secret_previous_key(self, sample_secret):
+        """Test that AES-GCM tokens from the rotated-out key still decrypt."""
+        from app import encryption
 
-        assert result is None
+        nonce = b"\x00" * encryption.AESGCM_NONCE_SIZE
+        token = encryption.AESGCM_TOKEN_VERSION + nonce + encryption.aead_suites[-1].encrypt(
+            nonce, sample_secret.encode("utf-8"), None
+        )
+
+        assert decrypt_secret(token) == sample_secret
+
+    def test_decrypt_secret_reads_fernet_tokens(self, aesgcm_writes, encrypted_secret_bytes):
+        """Test that Fernet tokens still decrypt once AES-GCM writes are on."""
+        assert decrypt_secret(encrypted_secret_bytes) == "This is a test secret"
+
+    def test_decrypt_secret_reads_fernet_previous_key(self, previous_fernet_key, sample_secret):
+        """Test that Fernet tokens from the rotated-out key still decrypt."""
+        from cryptography.fernet import Fernet
 
-    @patch("app.encryption.cipher_suite")
-    def test_decrypt_secret_unexpected_exception(self, mock_cipher):
-        """Test handling of unexpected exceptions during decryption."""
-        mock_cipher.decrypt.side_effect = Exception("Unexpected error")
+        token = Fernet(previous_fernet_key).encrypt(sample_secret.encode("utf-8"))
 
+        assert decrypt_secret(token) == sample_secret
+
+    @pytest.mark.parametrize(
+        "broken_cipher",
+        [InvalidToken(), Exception("Unexpected error")],
+        ids=["invalid-token", "unexpected"],
+        indirect=True,
+    )
+    def test_decrypt_secret_cipher_exception(self, broken_cipher):
+        """Test that exceptions raised by the cipher suite result in None."""
         result = decrypt_secret(b"some_encrypted_data")
 
         assert result is None
+        broken_cipher.decrypt.assert_called_once_with(b"some_encrypted_data")
 
 
 class TestEncryptionRoundtrip:
     """Test encryption and decryption roundtrip scenarios."""
 
-    def test_encrypt_decrypt_roundtrip(self):
+    @pytest.mark.parametrize("secret", ROUNDTRIP_SECRETS, ids=ROUNDTRIP_IDS)
+    def test_encrypt_decrypt_roundtrip(self, write_format, secret):
         """Test that encryption followed by decryption returns original text."""
-        original_secrets = [
-            "Simple test",
-            "Multi\nline\ntext",
-            "Special chars: !@#$%^&*()",
-            "Unicode: 🔒🚀🎯",
-            "Long text: " + "x" * 1000,
-        ]
-
-        for secret in original_secrets:
-            encrypted = encrypt_secret(secret)
-            decrypted = decrypt_secret(encrypted)
-            assert decrypted == secret
-
-    def test_different_encryptions_same_plaintext(self, sample_secret):
+        encrypted = encrypt_secret(secret)
+        decrypted = decrypt_secret(encrypted)
+        assert decrypted == secret
+
+    def test_different_encryptions_same_plaintext(self, write_format, sample_secret):
         """Test that encrypting the same plaintext produces different ciphertexts."""
         encrypted1 = encrypt_secret(sample_secret)
         encrypted2 = encrypt_secret(sample_secret)
 
-        # Due to Fernet's use of random IV, same plaintext should produce different ciphertexts
+        # Due to the random IV/nonce, same plaintext should produce different ciphertexts
         assert encrypted1 != encrypted2
 
         # But both should decrypt to the same plaintext
@@ -141,61 +223,91 @@ class TestEncryptionRoundtrip:
 class TestEncryptionModuleInitialization:
     """Test encryption module initialization error paths."""
 
-    def test_encryption_init_missing_key_attribute(self):
-        """Test encryption module initialization when key attribute is missing."""
-        # Test by creating a module-like mock that doesn't have the key attribute
-        original_config = sys.modules.get("config")
-
-        try:
-            # Create a mock config class that raises AttributeError
-            class MockConfigMissingKey:
-                pass  # No MASTER_ENCRYPTION_KEY_BYTES attribute
-
-            # Test what happens when we try to access the missing attribute
-            mock_config = MockConfigMissingKey()
-            with pytest.raises(AttributeError):
-                _ = mock_config.MASTER_ENCRYPTION_KEY_BYTES
-
-        finally:
-            if original_config:
-                sys.modules["config"] = original_config
-
-    def test_encryption_init_invalid_key_value(self):
-        """Test encryption module initialization with invalid key."""
-        # Test the ValueError path by directly testing Fernet with an invalid key
-        with pytest.raises(ValueError):
-            from cryptography.fernet import Fernet
-
-            Fernet(b"invalid_key_too_short")  # This will raise ValueError
-
-    def test_encryption_fernet_initialization_paths(self):
-        """Test that the error handling paths in encryption initialization work."""
-        # Since the module is already imported, test the logic by examining
-        # what would happen with various inputs to Fernet()
-        from cryptography.fernet import Fernet
-
-        # Test that normal valid key works
-        valid_key = Fernet.generate_key()
-        cipher = Fernet(valid_key)
-        assert cipher is not None
-
-        # Test that invalid key raises ValueError
-        with pytest.raises(ValueError):
-            Fernet(b"invalid")
+    @pytest.mark.parametrize(
+        "keys,message",
+        [(None, "MASTER_ENCRYPTION_KEY not set"), ([b"invalid"], "Invalid master key")],
+        ids=["missing-keys", "invalid-key"],
+    )
+    def test_encryption_init_error_exits(self, monkeypatch, keys, message):
+        """Test that module initialization exits on missing or invalid keys."""
+        from app import config, encryption
+
+        # Reloading re-runs the module init; keep the live suites so monkeypatch
+        # restores them for the rest of the session once the test finishes.
+        monkeypatch.setattr(encryption, "cipher_suite", encryption.cipher_suite)
+        monkeypatch.setattr(encryption, "aead_suites", encryption.aead_suites)
+        if keys is None:
+            # Drop the cached keys so init has to load them from a missing env var
+            monkeypatch.delattr(config.Config, "MASTER_ENCRYPTION_KEYS", raising=False)
+            monkeypatch.setattr(config.Config, "MASTER_ENCRYPTION_KEY", None)
+        else:
+            monkeypatch.setattr(config.Config, "MASTER_ENCRYPTION_KEYS", keys)
+
+        with pytest.raises(SystemExit, match=message):
+            importlib.reload(encryption)
+
+    def test_rfernet_opt_in_without_package_exits(self, monkeypatch):
+        """Test that USE_RFERNET fails fast instead of silently falling back."""
+        import sys
+        from app import config, encryption
+
+        monkeypatch.setattr(encryption, "cipher_suite", encryption.cipher_suite)
+        monkeypatch.setattr(encryption, "aead_suites", encryption.aead_suites)
+        monkeypatch.setattr(encryption, "rfernet", encryption.rfernet)
+        monkeypatch.setattr(config.Config, "USE_RFERNET", True)
+        # A None entry makes `import rfernet` raise ImportError on reload
+        monkeypatch.setitem(sys.modules, "rfernet", None)
+
+        with pytest.raises(SystemExit, match="rfernet is not installed"):
+            importlib.reload(encryption)
+
+    def test_default_backend_is_cryptography(self):
+        """Test that legacy reads use cryptography unless USE_RFERNET is set."""
+        from cryptography.fernet import MultiFernet
+        from app import encryption
 
-        # Test that non-bytes input raises TypeError or ValueError
-        with pytest.raises((TypeError, ValueError)):
-            Fernet("not_bytes")
+        assert isinstance(encryption.cipher_suite, MultiFernet)
 
     def test_encryption_module_has_cipher_suite(self):
         """Test that the encryption module properly initialized cipher_suite."""
-        from app import encryption
+        from app import config, encryption
 
-        # The cipher_suite should be initialized if we got here
+        # Import-time init already ran; the round-trip tests exercise the suites
         assert encryption.cipher_suite is not None
+        assert len(encryption.aead_suites) == len(config.Config.load_encryption_keys())
+
+
+class TestRustFernetAdapter:
+    """Test the optional rfernet-backed cipher suite."""
+
+    @pytest.fixture
+    def keys(self, fernet_key, previous_fernet_key):
+        pytest.importorskip("rfernet")
+        return [fernet_key, previous_fernet_key]
+
+    def test_tokens_interoperate_with_cryptography(self, keys):
+        """Test that rfernet and cryptography read each other's tokens."""
+        from cryptography.fernet import Fernet
+        from app.encryption import RustFernet
+
+        suite = RustFernet(keys[:1])
+
+        assert Fernet(keys[0]).decrypt(suite.encrypt(b"rust")) == b"rust"
+        assert suite.decrypt(Fernet(keys[0]).encrypt(b"python")) == b"python"
+
+    def test_rotation_decrypts_previous_key(self, keys):
+        """Test that a multi-key suite accepts tokens from the previous key."""
+        from cryptography.fernet import Fernet
+        from app.encryption import RustFernet
+
+        suite = RustFernet(keys)
+
+        assert suite.decrypt(Fernet(keys[1]).encrypt(b"old")) == b"old"
+
+    @pytest.mark.parametrize("token", [b"invalid_encrypted_data", "é".encode()])
+    def test_invalid_token_raises_invalid_token(self, keys, token):
+        """Test that rfernet errors surface as cryptography's InvalidToken."""
+        from app.encryption import RustFernet
 
-        # Test that we can use it for encryption/decryption
-        test_data = b"test data"
-        encrypted = encryption.cipher_suite.encrypt(test_data)
-        decrypted = encryption.cipher_suite.decrypt(encrypted)
-        assert decrypted == test_data
+        with pytest.raises(InvalidToken):
+            RustFernet(keys[:1]).decrypt(token)
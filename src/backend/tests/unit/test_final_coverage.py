@@ -2,7 +2,11 @@
 import pytest
 import json
 import os
-from unittest.mock import patch, MagicMock
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+from app.models import Secret
+from app.storage import generate_unique_link_id, is_valid_link_id
 
 
 class TestFinalCoverage:
@@ -43,76 +47,44 @@ class TestFinalCoverage:
         assert response.status_code == 413
         assert "exceeds maximum length" in response.get_json()['error']
     
-    def test_edge_case_mime_types(self, client):
+    @pytest.mark.parametrize("case", [
+        {"payload": "test"},  # No mime specified, should default
+        {"payload": "test", "mime": ""},  # Empty mime
+        {"payload": "test", "mime": "text/plain; charset=utf-8"},  # With charset
+        {"payload": "test", "mime": "custom/type"},  # Custom type
+    ], ids=["default", "empty", "charset", "custom"])
+    def test_edge_case_mime_types(self, client, case):
         """Test edge cases for MIME type handling."""
-        edge_cases = [
-            {"payload": "test"},  # No mime specified, should default
-            {"payload": "test", "mime": ""},  # Empty mime
-            {"payload": "test", "mime": "text/plain; charset=utf-8"},  # With charset
-            {"payload": "test", "mime": "custom/type"},  # Custom type
-        ]
-        
-        for case in edge_cases:
-            response = client.post('/api/share',
-                                 data=json.dumps(case),
-                                 content_type='application/json')
-            if 'mime' not in case or case['mime'] == "":
-                # Should use default
-                assert response.status_code == 201
-            else:
-                assert response.status_code == 201
+        response = client.post('/api/share',
+                             data=json.dumps(case),
+                             content_type='application/json')
+        assert response.status_code == 201
     
-    def test_config_loading_edge_cases(self):
-        """Test config loading scenarios."""
-        # Test when .env file doesn't exist
+    def test_config_loading_edge_cases(self, caplog):
+        """Test config falls back to environment variables when .env is missing."""
+        import importlib
+        import app.config
+        
         with patch('os.path.exists', return_value=False):
-            # This should still work if env vars are set
-            import importlib
-            import app.config
             importlib.reload(app.config)
-    
-    def test_encryption_edge_cases(self, app_context):
-        """Test encryption module edge cases."""
-        from app.encryption import encrypt_secret, decrypt_secret
-        
-        # Test with minimal but non-empty string
-        minimal_string = "x"
-        encrypted = encrypt_secret(minimal_string)
-        assert encrypted is not None
-        decrypted = decrypt_secret(encrypted)
-        assert decrypted == minimal_string
         
-        # Test with very long string
-        long_string = "A" * 10000
-        encrypted = encrypt_secret(long_string)
-        decrypted = decrypt_secret(encrypted)
-        assert decrypted == long_string
-        
-        # Test with unicode
-        unicode_string = "🔐 Test émoji 世界"
-        encrypted = encrypt_secret(unicode_string)
-        decrypted = decrypt_secret(encrypted)
-        assert decrypted == unicode_string
+        assert ".env file not found" in caplog.text
+        keys = app.config.Config.load_encryption_keys()
+        assert keys == (os.environ['MASTER_ENCRYPTION_KEY'].encode(),
+                        os.environ['MASTER_ENCRYPTION_KEY_PREVIOUS'].encode())
     
-    def test_storage_generate_link_id(self, app_context):
+    def test_storage_generate_link_id(self):
         """Test link ID generation."""
-        from app.storage import generate_unique_link_id
-        import uuid
-        
         # Generate multiple IDs and verify they're unique
         ids = [generate_unique_link_id() for _ in range(10)]
         assert len(set(ids)) == 10  # All unique
         
-        # Verify they're valid UUIDs
+        # Verify they have the issued link id format
         for link_id in ids:
-            uuid.UUID(link_id)  # Should not raise exception
+            assert is_valid_link_id(link_id)
     
-    def test_models_edge_cases(self, app_context):
+    def test_models_edge_cases(self):
         """Test models with edge case data."""
-        from app.models import Secret
-        from datetime import datetime, timezone
-        import base64
-        
         # Test secret with minimal data
         minimal_secret = Secret(
             link_id="test-minimal",
@@ -149,7 +121,7 @@ class TestFinalCoverage:
                                  data=json.dumps({"payload": payload}),
                                  content_type='application/json')
             assert response.status_code == 201
-            data = json.loads(response.data)
+            data = response.get_json()
             responses.append(data)
         
         # All responses should have same structure
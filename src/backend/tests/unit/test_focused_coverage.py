@@ -5,6 +5,14 @@ import time
 from unittest.mock import patch
 
 
+# Non-existent secret URLs, built once outside the timing loop
+_FAKE_SECRET_URLS = tuple(f'/api/share/secret/{fake_id}' for fake_id in (
+    "aaaaaaaa-bbbb-cccc-dddd-eeeeeeeeeeee",
+    "11111111-2222-3333-4444-555555555555",
+    "zzzzzzzz-yyyy-xxxx-wwww-vvvvvvvvvvvv",
+))
+
+
 class TestFocusedCoverage:
     """Focused tests to improve coverage on specific areas."""
     
@@ -12,7 +20,7 @@ class TestFocusedCoverage:
         """Test health endpoint thoroughly."""
         response = client.get('/health')
         assert response.status_code == 200
-        data = json.loads(response.data)
+        data = response.get_json()
         assert 'status' in data
         assert data['status'] == 'healthy'
         
@@ -23,29 +31,23 @@ class TestFocusedCoverage:
     def test_anti_enumeration_timing_consistency(self, client):
         """Test anti-enumeration timing behavior in detail."""
         # Test multiple non-existent secrets to verify timing delays
-        fake_ids = [
-            "aaaaaaaa-bbbb-cccc-dddd-eeeeeeeeeeee",
-            "11111111-2222-3333-4444-555555555555",
-            "zzzzzzzz-yyyy-xxxx-wwww-vvvvvvvvvvvv"
-        ]
-        
         response_times = []
-        for fake_id in fake_ids:
-            start_time = time.time()
-            response = client.get(f'/api/share/secret/{fake_id}')
-            end_time = time.time()
+        for url in _FAKE_SECRET_URLS:
+            start_ns = time.perf_counter_ns()
+            response = client.get(url)
+            elapsed_ns = time.perf_counter_ns() - start_ns
             
             assert response.status_code == 200
-            data = json.loads(response.data)
+            data = response.get_json()
             assert data['payload'] == "Dummy payload for non-existent secret"
             assert 'e2ee' in data
             assert '_padding' in data
             
-            response_times.append(end_time - start_time)
+            response_times.append(elapsed_ns)
         
         # Verify minimum delay is applied (anti-timing attack)
         for response_time in response_times:
-            assert response_time >= 0.004  # At least 4ms (accounting for test variance)
+            assert response_time >= 4_000_000  # At least 4ms (accounting for test variance)
     
     def test_request_validation_edge_cases(self, client):
         """Test various request validation scenarios."""
@@ -68,7 +70,6 @@ class TestFocusedCoverage:
     
     def test_e2ee_validation_detailed(self, client):
         """Test E2EE validation in detail."""
-        # Test valid E2EE request
         valid_e2ee = {
             "payload": "encrypted_content_from_client",
             "mime": "application/json",
@@ -82,43 +83,38 @@ class TestFocusedCoverage:
                              data=json.dumps(valid_e2ee),
                              content_type='application/json')
         assert response.status_code == 201
-        data = json.loads(response.data)
+        data = response.get_json()
         assert data['e2ee'] is True
         assert data['mime'] == "application/json"
         assert 'link_id' in data
-        
-        # Test E2EE with invalid field types
-        invalid_e2ee_cases = [
-            {"payload": "test", "e2ee": {"salt": 123, "nonce": "valid"}},  # Invalid salt type
-            {"payload": "test", "e2ee": {"salt": "valid", "nonce": 456}},  # Invalid nonce type
-            {"payload": "test", "e2ee": {"salt": "valid"}},  # Missing nonce
-            {"payload": "test", "e2ee": {"nonce": "valid"}},  # Missing salt
-        ]
-        
-        for invalid_case in invalid_e2ee_cases:
-            response = client.post('/api/share',
-                                 data=json.dumps(invalid_case),
-                                 content_type='application/json')
-            assert response.status_code == 400
     
-    def test_mime_type_handling(self, client):
-        """Test MIME type validation and handling."""
-        test_cases = [
-            {"payload": "test", "mime": "text/plain"},
-            {"payload": "test", "mime": "application/json"},
-            {"payload": "test", "mime": "text/html"},
-            {"payload": "test", "mime": "application/pdf"},
-        ]
-        
-        for case in test_cases:
-            response = client.post('/api/share',
-                                 data=json.dumps(case),
-                                 content_type='application/json')
-            assert response.status_code == 201
-            data = json.loads(response.data)
-            assert data['mime'] == case['mime']
-        
-        # Test invalid MIME type
+    @pytest.mark.parametrize("invalid_case", [
+        {"payload": "test", "e2ee": {"salt": 123, "nonce": "valid"}},
+        {"payload": "test", "e2ee": {"salt": "valid", "nonce": 456}},
+        {"payload": "test", "e2ee": {"salt": "valid"}},
+        {"payload": "test", "e2ee": {"nonce": "valid"}},
+    ], ids=["salt-type", "nonce-type", "missing-nonce", "missing-salt"])
+    def test_e2ee_validation_invalid(self, client, invalid_case):
+        """Test E2EE requests with invalid or missing fields are rejected."""
+        response = client.post('/api/share',
+                             data=json.dumps(invalid_case),
+                             content_type='application/json')
+        assert response.status_code == 400
+    
+    @pytest.mark.parametrize("mime", [
+        "text/plain", "application/json", "text/html", "application/pdf",
+    ])
+    def test_mime_type_handling(self, client, mime):
+        """Test MIME type is accepted and echoed back."""
+        response = client.post('/api/share',
+                             data=json.dumps({"payload": "test", "mime": mime}),
+                             content_type='application/json')
+        assert response.status_code == 201
+        data = response.get_json()
+        assert data['mime'] == mime
+    
+    def test_mime_type_invalid(self, client):
+        """Test non-string MIME type is rejected."""
         response = client.post('/api/share',
                              data=json.dumps({"payload": "test", "mime": 123}),
                              content_type='application/json')
@@ -152,22 +148,20 @@ class TestFocusedCoverage:
         response = client.options('/api/share')
         assert response.status_code == 200
     
-    def test_unicode_handling(self, client):
+    @pytest.mark.parametrize("payload", [
+        "Hello 世界",
+        "🔐 Secret émojis 🗝️",
+        "Тест на русском",
+        "العربية",
+        "Special chars: \n\t\r\"'\\",
+    ], ids=["cjk", "emoji", "cyrillic", "arabic", "escapes"])
+    def test_unicode_handling(self, client, payload):
         """Test unicode and special character handling."""
-        unicode_payloads = [
-            "Hello 世界",
-            "🔐 Secret émojis 🗝️",
-            "Тест на русском",
-            "العربية",
-            "Special chars: \n\t\r\"'\\",
-        ]
+        response = client.post('/api/share',
+                             data=json.dumps({"payload": payload}),
+                             content_type='application/json')
+        assert response.status_code == 201
         
-        for payload in unicode_payloads:
-            response = client.post('/api/share',
-                                 data=json.dumps({"payload": payload}),
-                                 content_type='application/json')
-            assert response.status_code == 201
-            
-            # Verify the response contains proper unicode
-            data = json.loads(response.data)
-            assert 'link_id' in data
\ No newline at end of file
+        # Verify the response contains proper unicode
+        data = response.get_json()
+        assert 'link_id' in data
\ No newline at end of file
@@ -1,8 +1,16 @@
 # backend/tests/test_main.py
+import base64
 import pytest
-import json
-import uuid
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch
+
+from app.encryption import AESGCM_TOKEN_VERSION
+from app.storage import is_valid_link_id
+
+# One byte over MAX_SECRET_LENGTH_BYTES (100KB = 102400 bytes)
+_OVERSIZE_SECRET = "x" * (100 * 1024 + 1)
+# Well-formed UUID that is never issued; no entropy needed for a missing lookup
+_NON_EXISTENT_ID = "00000000-0000-0000-0000-000000000000"
+_NON_EXISTENT_URL = f'/api/share/secret/{_NON_EXISTENT_ID}'
 
 
 class TestHealthEndpoint:
@@ -13,7 +21,7 @@ class TestHealthEndpoint:
         response = client.get('/health')
         
         assert response.status_code == 200
-        data = json.loads(response.data)
+        data = response.get_json()
         assert data['status'] == 'healthy'
         assert data['message'] == 'Backend is running.'
 
@@ -25,52 +33,43 @@ class TestShareSecretAPI:
         """Test successful secret sharing."""
         secret_data = {"payload": "This is a test secret"}
         
-        response = client.post('/api/share', 
-                              data=json.dumps(secret_data),
-                              content_type='application/json')
+        response = client.post('/api/share', json=secret_data)
         
         assert response.status_code == 201
-        data = json.loads(response.data)
+        data = response.get_json()
         assert 'link_id' in data
         assert 'message' in data
         assert data['message'] == 'Secret stored successfully.'
         
-        # Verify link_id is a valid UUID
-        uuid.UUID(data['link_id'])  # Will raise if invalid
+        # Verify link_id has the issued format
+        assert is_valid_link_id(data['link_id'])
     
     def test_share_secret_missing_json(self, client):
         """Test request without JSON content type."""
         response = client.post('/api/share', data='not json')
         
         assert response.status_code == 400
-        data = json.loads(response.data)
-        assert data['error'] == 'Request must be JSON'
+        assert b"Request must be JSON" in response.data
     
     def test_share_secret_missing_secret_field(self, client):
         """Test request missing the 'payload' field."""
         secret_data = {"not_secret": "value"}
         
-        response = client.post('/api/share',
-                              data=json.dumps(secret_data),
-                              content_type='application/json')
+        response = client.post('/api/share', json=secret_data)
         
         assert response.status_code == 400
-        data = json.loads(response.data)
-        assert data['error'] == "Missing 'payload' field in JSON"
+        assert b"Missing 'payload' field in JSON" in response.data
     
     def test_share_secret_empty_secret(self, client):
         """Test request with empty secret."""
         secret_data = {"payload": ""}
         
-        response = client.post('/api/share',
-                              data=json.dumps(secret_data),
-                              content_type='application/json')
+        response = client.post('/api/share', json=secret_data)
         
         assert response.status_code == 400
-        data = json.loads(response.data)
-        assert data['error'] == "Missing 'payload' field in JSON"
+        assert b"Missing 'payload' field in JSON" in response.data
     
-    def test_share_secret_non_string_secret(self, client):
+    def test_share_secret_non_string_secret(self, app, client, main_module):
         """Test request with non-string secret."""
         test_cases = [
             {"payload": 123},
@@ -78,130 +77,106 @@ class TestShareSecretAPI:
             {"payload": {"nested": "object"}},
         ]
         
+        # Validation runs before any storage call, so drive the view directly
+        # instead of paying for a full test-client round-trip per case
         for secret_data in test_cases:
-            response = client.post('/api/share',
-                                  data=json.dumps(secret_data),
-                                  content_type='application/json')
+            with app.test_request_context('/api/share', method='POST', json=secret_data):
+                response, status = main_module.share_secret_api()
             
-            assert response.status_code == 400
-            data = json.loads(response.data)
-            assert data['error'] == "'payload' must be a string"
+            assert status == 400
+            assert response.get_json()['error'] == "'payload' must be a string"
         
         # Test None separately as it's treated as missing field
         secret_data = {"payload": None}
-        response = client.post('/api/share',
-                              data=json.dumps(secret_data),
-                              content_type='application/json')
+        response = client.post('/api/share', json=secret_data)
         assert response.status_code == 400
-        data = json.loads(response.data)
-        assert data['error'] == "Missing 'payload' field in JSON"
+        assert b"Missing 'payload' field in JSON" in response.data
     
     def test_share_secret_too_long(self, client):
         """Test request with secret exceeding maximum length."""
-        # Create a secret longer than MAX_SECRET_LENGTH_BYTES (100KB = 102400 bytes)
-        long_secret = "x" * 102401
-        secret_data = {"payload": long_secret}
+        secret_data = {"payload": _OVERSIZE_SECRET}
         
-        response = client.post('/api/share',
-                              data=json.dumps(secret_data),
-                              content_type='application/json')
+        response = client.post('/api/share', json=secret_data)
         
         assert response.status_code == 413
-        data = json.loads(response.data)
-        assert "Secret exceeds maximum length" in data['error']
+        assert b"Secret exceeds maximum length" in response.data
+    
+    def test_share_secret_too_long_multibyte(self, client):
+        """Test that the limit counts UTF-8 bytes, not characters."""
+        # 40,000 characters but 120,000 bytes, so only the encoded length trips the limit
+        response = client.post('/api/share', json={"payload": "€" * 40_000})
+        
+        assert response.status_code == 413
+        assert b"Secret exceeds maximum length" in response.data
     
     def test_share_secret_unicode_content(self, client):
         """Test sharing secret with unicode content."""
         secret_data = {"payload": "🔒 Unicode secret with émojis! 🚀"}
         
-        response = client.post('/api/share',
-                              data=json.dumps(secret_data),
-                              content_type='application/json')
+        response = client.post('/api/share', json=secret_data)
         
         assert response.status_code == 201
-        data = json.loads(response.data)
+        data = response.get_json()
         assert 'link_id' in data
     
-    def test_share_secret_encryption_error(self, client):
-        """Test handling of encryption errors."""
-        # Test with a very specific edge case that would cause encryption issues
-        # Since None is treated as missing field, use a different invalid type
-        
-        secret_data = {"payload": 123}  # This will fail validation with type error
-        
-        response = client.post('/api/share',
-                              data=json.dumps(secret_data),
-                              content_type='application/json')
-        
-        assert response.status_code == 400
-        data = json.loads(response.data)
-        assert "'payload' must be a string" == data['error']
-    
-    def test_share_secret_storage_error(self, client):
-        """Test handling of storage errors by testing edge cases."""
-        # This test will verify error handling by testing realistic edge cases
-        # rather than mocking, since mocking is complex with the current setup
-        
-        # Test with extremely long secret that might cause storage issues
-        # though this should be caught by length validation first
-        very_long_secret = "x" * (100 * 1024 + 1)  # Longer than MAX_SECRET_LENGTH_BYTES
-        secret_data = {"payload": very_long_secret}
-        
-        response = client.post('/api/share',
-                              data=json.dumps(secret_data),
-                              content_type='application/json')
-        
-        assert response.status_code == 413  # Payload Too Large
-        data = json.loads(response.data)
-        assert "Secret exceeds maximum length" in data['error']
+    @pytest.mark.parametrize("exc,status,msg", [
+        (ValueError("Encryption error"), 400, "Invalid input provided."),
+        (TypeError("Type error"), 400, "Invalid input provided."),
+        (Exception("Unexpected error"), 500, "Failed to store secret"),
+    ], ids=["value-error", "type-error", "unexpected"])
+    def test_share_secret_encryption_error(self, client, main_module, exc, status, msg):
+        """Test that encryption failures map to the expected status and message."""
+        with patch.object(main_module, 'encrypt_secret', side_effect=exc):
+            response = client.post('/api/share', json={"payload": "x"})
+        
+        assert response.status_code == status
+        assert msg in response.get_json()['error']
 
 
 class TestRetrieveSecretAPI:
     """Test cases for the /api/share/secret/<link_id> endpoint."""
     
-    def test_retrieve_secret_success(self, client):
+    def test_retrieve_secret_success(self, client, shared_secret_link):
         """Test successful secret retrieval."""
-        # First, store a secret
-        secret_text = "This is a test secret for retrieval"
-        secret_data = {"payload": secret_text}
-        
-        store_response = client.post('/api/share',
-                                   data=json.dumps(secret_data),
-                                   content_type='application/json')
-        
+        store_response, link_id = shared_secret_link
         assert store_response.status_code == 201
-        link_id = json.loads(store_response.data)['link_id']
         
         # Now retrieve it
         retrieve_response = client.get(f'/api/share/secret/{link_id}')
         
         assert retrieve_response.status_code == 200
-        data = json.loads(retrieve_response.data)
+        data = retrieve_response.get_json()
         assert 'payload' in data
-        assert data['payload'] == secret_text
+        assert data['payload'] == "shared-test"
         assert data.get('mime', 'text/plain') == 'text/plain'
     
+    @pytest.mark.parametrize("aesgcm", [False, True], ids=["fernet-writes", "aesgcm-writes"])
+    def test_retrieve_secret_each_write_format(self, client, mock_cosmos_container,
+                                               monkeypatch, aesgcm):
+        """Test that the stored token follows USE_AESGCM_WRITES and reads back either way."""
+        monkeypatch.setattr("app.encryption.Config.USE_AESGCM_WRITES", aesgcm)
+        link_id = client.post('/api/share', json={"payload": "flagged"}).get_json()['link_id']
+        
+        stored = base64.b64decode(mock_cosmos_container.items[link_id]['encrypted_secret'])
+        assert (stored[:1] == AESGCM_TOKEN_VERSION) is aesgcm
+        
+        response = client.get(f'/api/share/secret/{link_id}')
+        assert response.get_json()['payload'] == "flagged"
+    
     def test_retrieve_secret_not_found(self, client):
         """Test retrieval of non-existent secret - returns dummy data to prevent enumeration."""
-        non_existent_id = str(uuid.uuid4())
-        
-        response = client.get(f'/api/share/secret/{non_existent_id}')
+        response = client.get(_NON_EXISTENT_URL)
         
         # API returns 200 with dummy data to prevent enumeration attacks
         assert response.status_code == 200
-        data = json.loads(response.data)
+        data = response.get_json()
         # Should contain dummy response structure
         assert 'payload' in data
         assert 'mime' in data
     
-    def test_retrieve_secret_already_retrieved(self, client):
+    def test_retrieve_secret_already_retrieved(self, client, seeded_secret):
         """Test that secret can only be retrieved once."""
-        # Store a secret
-        secret_data = {"payload": "One-time secret"}
-        store_response = client.post('/api/share',
-                                   data=json.dumps(secret_data),
-                                   content_type='application/json')
-        link_id = json.loads(store_response.data)['link_id']
+        link_id, payload = seeded_secret
         
         # First retrieval should succeed
         first_response = client.get(f'/api/share/secret/{link_id}')
@@ -210,48 +185,51 @@ class TestRetrieveSecretAPI:
         # Second retrieval should return dummy data (not actual error)
         second_response = client.get(f'/api/share/secret/{link_id}')
         assert second_response.status_code == 200  # Returns dummy data, not 404
-        data = json.loads(second_response.data)
+        data = second_response.get_json()
         # Should be dummy data, not the original secret
         assert 'payload' in data
-        assert data['payload'] != "One-time secret"
+        assert data['payload'] != payload
     
-    def test_head_request_secret_exists(self, client):
+    def test_retrieve_secret_withheld_when_delete_fails(self, client, seeded_secret,
+                                                        mock_cosmos_container):
+        """Test that a secret that cannot be deleted is not returned (one-time claim)."""
+        link_id, payload = seeded_secret
+        mock_cosmos_container.errors['delete_item'] = Exception("Cosmos DB error")
+        
+        response = client.get(f'/api/share/secret/{link_id}')
+        
+        assert response.status_code == 200
+        assert response.get_json()['payload'] != payload
+        assert link_id in mock_cosmos_container.items
+    
+    def test_head_request_secret_exists(self, client, seeded_secret, mock_cosmos_container):
         """Test HEAD request for existing secret."""
-        # Store a secret
-        secret_data = {"payload": "Secret for HEAD test"}
-        store_response = client.post('/api/share',
-                                   data=json.dumps(secret_data),
-                                   content_type='application/json')
-        link_id = json.loads(store_response.data)['link_id']
-        
-        # HEAD request should return 200 without body
+        link_id, payload = seeded_secret
+        
+        # HEAD request should return 200 (the empty body is covered in test_final_coverage)
         head_response = client.head(f'/api/share/secret/{link_id}')
         assert head_response.status_code == 200
-        assert head_response.data == b''
         
-        # Secret should still exist after HEAD request
+        # HEAD never touches storage, so the secret is still there to be read once
+        assert mock_cosmos_container.reads == 0
         get_response = client.get(f'/api/share/secret/{link_id}')
-        assert get_response.status_code == 200
+        assert get_response.get_json()['payload'] == payload
     
     def test_head_request_secret_not_found(self, client):
         """Test HEAD request for non-existent secret - returns 200 to prevent enumeration."""
-        non_existent_id = str(uuid.uuid4())
-        
-        response = client.head(f'/api/share/secret/{non_existent_id}')
+        response = client.head(_NON_EXISTENT_URL)
         
         # API returns 200 to prevent enumeration attacks
         assert response.status_code == 200
-        assert response.data == b''
     
     def test_retrieve_secret_storage_failure(self, client):
         """Test handling when storage retrieval fails with non-existent ID."""
         # Test with a properly formatted but non-existent UUID
-        test_id = str(uuid.uuid4())
-        response = client.get(f'/api/share/secret/{test_id}')
+        response = client.get(_NON_EXISTENT_URL)
         
         # API returns 200 with dummy data to prevent enumeration
         assert response.status_code == 200
-        data = json.loads(response.data)
+        data = response.get_json()
         assert 'payload' in data
         assert 'mime' in data
     
@@ -265,27 +243,22 @@ class TestRetrieveSecretAPI:
         
         # API returns 200 with dummy data to prevent enumeration
         assert response.status_code == 200
-        data = json.loads(response.data)
+        data = response.get_json()
         assert 'payload' in data
         assert 'mime' in data
 
 
 # Removed problematic integration tests that don't align with anti-enumeration behavior
     
-    def test_unicode_secret_roundtrip(self, client):
+    @pytest.mark.parametrize('created_secret',
+                             ["🔒 Sécret with unicodé characters! 🚀 テスト"],
+                             ids=["unicode"], indirect=True)
+    def test_unicode_secret_roundtrip(self, client, created_secret):
         """Test storing and retrieving unicode secrets."""
-        unicode_secret = "🔒 Sécret with unicodé characters! 🚀 テスト"
-        
-        # Store
-        response = client.post('/api/share',
-                             data=json.dumps({"payload": unicode_secret}),
-                             content_type='application/json')
-        assert response.status_code == 201
-        link_id = json.loads(response.data)['link_id']
+        link_id, unicode_secret = created_secret
         
-        # Retrieve
         response = client.get(f'/api/share/secret/{link_id}')
         assert response.status_code == 200
         
-        data = json.loads(response.data)
+        data = response.get_json()
         assert data['payload'] == unicode_secret
\ No newline at end of file
@@ -1,7 +1,7 @@
 # backend/tests/test_models.py
 import pytest
 import uuid
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timezone
 
 from app.models import Secret
 
@@ -94,6 +94,16 @@ class TestSecretModel:
         reconstructed = Secret.from_dict(secret_dict)
         assert reconstructed.e2ee_data == e2ee_data
     
+    def test_secret_ttl_roundtrip(self):
+        """Test that a per-document TTL is stored and read back, and omitted when unset."""
+        secret = Secret(link_id=str(uuid.uuid4()), encrypted_secret=b"data", ttl=3600)
+        
+        secret_dict = secret.to_dict()
+        assert secret_dict['ttl'] == 3600
+        assert Secret.from_dict(secret_dict).ttl == 3600
+        
+        assert 'ttl' not in Secret(link_id=secret.link_id, encrypted_secret=b"data").to_dict()
+    
     def test_secret_repr(self):
         """Test Secret __repr__ method."""
         link_id = str(uuid.uuid4())
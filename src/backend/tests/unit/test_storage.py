@@ -1,37 +1,68 @@
 # backend/tests/test_storage.py
+import base64
+import re
 import pytest
 import uuid
-from datetime import datetime, timezone, timedelta
-from unittest.mock import patch, MagicMock
 
 from app.storage import (
     generate_unique_link_id,
+    is_valid_link_id,
     store_encrypted_secret,
     retrieve_secret,
     delete_secret,
     retrieve_and_delete_secret
 )
 from app.models import Secret
+from app.config import Config
+
+# Error message pattern, compiled once for pytest.raises(match=...)
+_MSG_NOT_BYTES = re.compile("Encrypted secret data must be bytes")
+
+# Well-formed link id for tests that stub the container response
+_LINK_ID = "3f2b8c1e-6d4a-4b7e-9c2f-1a5e8d7b0c4d"
+
+# Link ids that can never be issued by generate_unique_link_id
+_MALFORMED_LINK_IDS = (
+    "not-a-uuid",
+    "'; DROP TABLE secrets; --",
+    "../../etc/passwd",
+    _LINK_ID.upper(),
+    " " * 36,
+    "A" * 21 + "B",
+)
+_MALFORMED_LINK_ID_IDS = (
+    "plain", "sql", "path-traversal", "uppercase", "whitespace", "non-canonical-base64",
+)
+
+
+@pytest.fixture(autouse=True)
+def _patched_container(mock_cosmos_session):
+    """Route every storage call in this module to the test's mock container."""
+    return mock_cosmos_session
 
 
 class TestGenerateUniqueLinkId:
     """Test cases for the generate_unique_link_id function."""
     
     def test_generate_unique_link_id_format(self):
-        """Test that generated link ID is a valid UUID string."""
+        """Test that generated link ID is 16 bytes of unpadded URL-safe base64."""
         link_id = generate_unique_link_id()
         
         assert isinstance(link_id, str)
-        # Should be able to parse as UUID
-        parsed_uuid = uuid.UUID(link_id)
-        assert str(parsed_uuid) == link_id
+        assert len(link_id) == 22
+        assert len(base64.urlsafe_b64decode(link_id + "==")) == 16
+        assert is_valid_link_id(link_id)
+    
+    def test_legacy_uuid_link_id_is_valid(self):
+        """Test that UUID link ids issued before the switch are still accepted."""
+        assert is_valid_link_id(str(uuid.uuid4()))
     
     def test_generate_unique_link_id_uniqueness(self):
         """Test that multiple calls generate unique IDs."""
-        ids = [generate_unique_link_id() for _ in range(100)]
+        ids = {generate_unique_link_id() for _ in range(100)}
         
         # All IDs should be unique
-        assert len(set(ids)) == 100
+        assert len(ids) == 100
 
 
 class TestStoreEncryptedSecret:
@@ -41,29 +72,28 @@ class TestStoreEncryptedSecret:
         """Test successful storage of encrypted secret."""
         encrypted_data = b"encrypted_test_data"
         
-        with patch('app.storage.get_container', return_value=mock_cosmos_container):
-            result = store_encrypted_secret(encrypted_data)
+        result = store_encrypted_secret(encrypted_data)
         
         assert result is not None
         assert isinstance(result, str)
         
-        # Verify it was stored in mock container
-        assert mock_cosmos_container.create_item.called
+        # Verify it was stored in mock container with the configured TTL
+        assert mock_cosmos_container.creates == 1
+        assert mock_cosmos_container.items[result]['ttl'] == Config.SECRET_TTL_SECONDS
     
     def test_store_encrypted_secret_invalid_type(self):
         """Test that non-bytes input raises TypeError."""
-        with pytest.raises(TypeError, match="Encrypted secret data must be bytes"):
+        with pytest.raises(TypeError, match=_MSG_NOT_BYTES):
             store_encrypted_secret("not_bytes")
         
-        with pytest.raises(TypeError, match="Encrypted secret data must be bytes"):
+        with pytest.raises(TypeError, match=_MSG_NOT_BYTES):
             store_encrypted_secret(123)
     
     def test_store_encrypted_secret_database_error(self, mock_cosmos_container):
         """Test handling of database errors during storage."""
-        mock_cosmos_container.create_item.side_effect = Exception("Cosmos DB error")
+        mock_cosmos_container.errors['create_item'] = Exception("Cosmos DB error")
         
-        with patch('app.storage.get_container', return_value=mock_cosmos_container):
-            result = store_encrypted_secret(b"test_data")
+        result = store_encrypted_secret(b"test_data")
         
         assert result is None
 
@@ -75,9 +105,8 @@ class TestRetrieveAndDeleteSecret:
         """Test successful retrieval and deletion of secret."""
         # First store a secret
         encrypted_data = b"test_encrypted_data"
-        link_id = "test-link-id"
+        link_id = _LINK_ID
         
-        from app.models import Secret
         mock_secret = Secret(
             link_id=link_id,
             encrypted_secret=encrypted_data,
@@ -85,47 +114,46 @@ class TestRetrieveAndDeleteSecret:
             mime_type="text/plain"
         )
         
-        # Override the side_effect to return our mock data
-        mock_cosmos_container.read_item.side_effect = None
-        mock_cosmos_container.read_item.return_value = mock_secret.to_dict()
-        
-        # Override delete_item side_effect 
-        mock_cosmos_container.delete_item.side_effect = None
+        mock_cosmos_container.items[link_id] = mock_secret.to_dict()
         
-        with patch('app.storage.get_container', return_value=mock_cosmos_container):
-            result = retrieve_and_delete_secret(link_id)
+        result = retrieve_and_delete_secret(link_id)
         
         assert result is not None
         assert result.encrypted_secret == encrypted_data
         
         # Verify it was deleted from mock container for non-E2EE secrets
-        assert mock_cosmos_container.delete_item.called
+        assert mock_cosmos_container.deletes == 1
+        assert link_id not in mock_cosmos_container.items
     
-    def test_retrieve_and_delete_secret_not_found(self, mock_cosmos_container):
+    def test_retrieve_and_delete_secret_delete_fails(self, mock_cosmos_container):
+        """Test that a secret is withheld when it cannot be deleted after the read."""
+        mock_cosmos_container.items[_LINK_ID] = Secret(
+            link_id=_LINK_ID, encrypted_secret=b"data"
+        ).to_dict()
+        mock_cosmos_container.errors['delete_item'] = Exception("Cosmos DB error")
+        
+        assert retrieve_and_delete_secret(_LINK_ID) is None
+        assert _LINK_ID in mock_cosmos_container.items
+    
+    def test_retrieve_and_delete_secret_not_found(self):
         """Test retrieval of non-existent secret returns None."""
-        from azure.cosmos.exceptions import CosmosResourceNotFoundError
         non_existent_id = str(uuid.uuid4())
         
-        mock_cosmos_container.read_item.side_effect = CosmosResourceNotFoundError()
-        
-        with patch('app.storage.get_container', return_value=mock_cosmos_container):
-            result = retrieve_and_delete_secret(non_existent_id)
+        result = retrieve_and_delete_secret(non_existent_id)
         
         assert result is None
     
-    def test_retrieve_and_delete_secret_invalid_input(self, mock_cosmos_container):
+    def test_retrieve_and_delete_secret_invalid_input(self):
         """Test retrieval with invalid input returns None."""
-        with patch('app.storage.get_container', return_value=mock_cosmos_container):
-            assert retrieve_and_delete_secret("") is None
-            assert retrieve_and_delete_secret(None) is None
-            assert retrieve_and_delete_secret(123) is None
+        assert retrieve_and_delete_secret("") is None
+        assert retrieve_and_delete_secret(None) is None
+        assert retrieve_and_delete_secret(123) is None
     
     def test_retrieve_and_delete_secret_database_error(self, mock_cosmos_container):
         """Test handling of database errors during retrieval."""
-        mock_cosmos_container.read_item.side_effect = Exception("Cosmos DB error")
+        mock_cosmos_container.errors['read_item'] = Exception("Cosmos DB error")
         
-        with patch('app.storage.get_container', return_value=mock_cosmos_container):
-            result = retrieve_and_delete_secret("test_id")
+        result = retrieve_and_delete_secret(_LINK_ID)
         
         assert result is None
 
@@ -136,10 +164,9 @@ class TestRetrieveSecret:
     def test_retrieve_secret_success(self, mock_cosmos_container):
         """Test successful retrieval of secret without deletion."""
         encrypted_data = b"test_encrypted_data"
-        link_id = "test-link-id"
+        link_id = _LINK_ID
         
         # Mock the return value for read_item
-        from app.models import Secret
         mock_secret = Secret(
             link_id=link_id,
             encrypted_secret=encrypted_data,
@@ -147,42 +174,33 @@ class TestRetrieveSecret:
             mime_type="text/plain"
         )
         
-        # Override the side_effect to return our mock data
-        mock_cosmos_container.read_item.side_effect = None
-        mock_cosmos_container.read_item.return_value = mock_secret.to_dict()
+        mock_cosmos_container.items[link_id] = mock_secret.to_dict()
         
-        with patch('app.storage.get_container', return_value=mock_cosmos_container):
-            result = retrieve_secret(link_id)
+        result = retrieve_secret(link_id)
         
         assert result is not None
         assert result.encrypted_secret == encrypted_data
         assert result.link_id == link_id
     
-    def test_retrieve_secret_not_found(self, mock_cosmos_container):
+    def test_retrieve_secret_not_found(self):
         """Test retrieval of non-existent secret returns None."""
-        from azure.cosmos.exceptions import CosmosResourceNotFoundError
         non_existent_id = str(uuid.uuid4())
         
-        mock_cosmos_container.read_item.side_effect = CosmosResourceNotFoundError()
-        
-        with patch('app.storage.get_container', return_value=mock_cosmos_container):
-            result = retrieve_secret(non_existent_id)
+        result = retrieve_secret(non_existent_id)
         
         assert result is None
     
-    def test_retrieve_secret_invalid_input(self, mock_cosmos_container):
+    def test_retrieve_secret_invalid_input(self):
         """Test retrieval with invalid input returns None."""
-        with patch('app.storage.get_container', return_value=mock_cosmos_container):
-            assert retrieve_secret("") is None
-            assert retrieve_secret(None) is None
-            assert retrieve_secret(123) is None
+        assert retrieve_secret("") is None
+        assert retrieve_secret(None) is None
+        assert retrieve_secret(123) is None
     
     def test_retrieve_secret_database_error(self, mock_cosmos_container):
         """Test handling of database errors during retrieval."""
-        mock_cosmos_container.read_item.side_effect = Exception("Cosmos DB error")
+        mock_cosmos_container.errors['read_item'] = Exception("Cosmos DB error")
         
-        with patch('app.storage.get_container', return_value=mock_cosmos_container):
-            result = retrieve_secret("test_id")
+        result = retrieve_secret(_LINK_ID)
         
         assert result is None
 
@@ -194,44 +212,50 @@ class TestDeleteSecret:
         """Test successful deletion of secret."""
         test_id = str(uuid.uuid4())
         
-        # Override delete_item side_effect 
-        mock_cosmos_container.delete_item.side_effect = None
+        mock_cosmos_container.items[test_id] = {'id': test_id}
         
-        with patch('app.storage.get_container', return_value=mock_cosmos_container):
-            result = delete_secret(test_id)
+        result = delete_secret(test_id)
         
         assert result is True
-        assert mock_cosmos_container.delete_item.called
+        assert mock_cosmos_container.deletes == 1
+        assert test_id not in mock_cosmos_container.items
     
-    def test_delete_secret_not_found(self, mock_cosmos_container):
+    def test_delete_secret_not_found(self):
         """Test deletion of non-existent secret returns False."""
-        from azure.cosmos.exceptions import CosmosResourceNotFoundError
         non_existent_id = str(uuid.uuid4())
         
-        mock_cosmos_container.delete_item.side_effect = CosmosResourceNotFoundError()
-        
-        with patch('app.storage.get_container', return_value=mock_cosmos_container):
-            result = delete_secret(non_existent_id)
+        result = delete_secret(non_existent_id)
         
         assert result is False
     
-    def test_delete_secret_invalid_input(self, mock_cosmos_container):
+    def test_delete_secret_invalid_input(self):
         """Test deletion with invalid input returns False."""
-        with patch('app.storage.get_container', return_value=mock_cosmos_container):
-            assert delete_secret("") is False
-            assert delete_secret(None) is False
-            assert delete_secret(123) is False
+        assert delete_secret("") is False
+        assert delete_secret(None) is False
+        assert delete_secret(123) is False
     
     def test_delete_secret_database_error(self, mock_cosmos_container):
         """Test handling of database errors during deletion."""
-        mock_cosmos_container.delete_item.side_effect = Exception("Cosmos DB error")
+        mock_cosmos_container.errors['delete_item'] = Exception("Cosmos DB error")
         
-        with patch('app.storage.get_container', return_value=mock_cosmos_container):
-            result = delete_secret("test_id")
+        result = delete_secret(_LINK_ID)
         
         assert result is False
 
 
+class TestMalformedLinkIds:
+    """Malformed link ids are rejected before any Cosmos DB call."""
+    
+    @pytest.mark.parametrize("link_id", _MALFORMED_LINK_IDS, ids=_MALFORMED_LINK_ID_IDS)
+    def test_lookup_skips_container(self, mock_cosmos_container, link_id):
+        """Test that retrieve and delete return early for malformed ids."""
+        assert retrieve_and_delete_secret(link_id) is None
+        assert delete_secret(link_id) is False
+        
+        assert mock_cosmos_container.reads == 0
+        assert mock_cosmos_container.deletes == 0
+
+
 class TestStorageIntegration:
     """Integration tests for storage functions."""
     
@@ -239,44 +263,26 @@ class TestStorageIntegration:
         """Test complete flow: store, retrieve, delete."""
         encrypted_data = b"integration_test_data"
         
-        # Override create_item side_effect 
-        mock_cosmos_container.create_item.side_effect = None
-        
-        with patch('app.storage.get_container', return_value=mock_cosmos_container):
-            # Store
-            link_id = store_encrypted_secret(encrypted_data)
-            assert link_id is not None
-            
-            # Mock retrieve response
-            from app.models import Secret
-            mock_secret = Secret(
-                link_id=link_id,
-                encrypted_secret=encrypted_data,
-                is_e2ee=False,
-                mime_type="text/plain"
-            )
-            
-            # Override read_item side_effect 
-            mock_cosmos_container.read_item.side_effect = None
-            mock_cosmos_container.read_item.return_value = mock_secret.to_dict()
-            
-            # Retrieve (without deletion)
-            retrieved_secret = retrieve_secret(link_id)
-            assert retrieved_secret is not None
-            assert retrieved_secret.encrypted_secret == encrypted_data
-            
-            # Override delete_item side_effect 
-            mock_cosmos_container.delete_item.side_effect = None
-            
-            # Retrieve and delete
-            retrieved_data = retrieve_and_delete_secret(link_id)
-            assert retrieved_data is not None
-            assert retrieved_data.encrypted_secret == encrypted_data
-            
-            # Verify deletion was called
-            assert mock_cosmos_container.delete_item.called
+        # create/read/delete all share the mock container's in-memory store
+        # Store
+        link_id = store_encrypted_secret(encrypted_data)
+        assert link_id is not None
+        
+        # Retrieve once (read), then delete by id
+        retrieved_secret = retrieve_secret(link_id)
+        assert retrieved_secret is not None
+        assert retrieved_secret.encrypted_secret == encrypted_data
+        assert delete_secret(link_id) is True
+        
+        # One read and one delete, then the secret is gone
+        assert mock_cosmos_container.reads == 1
+        assert mock_cosmos_container.deletes == 1
+        assert retrieve_secret(link_id) is None
+        
+        # Expiry is left to the container TTL, so storage never scans with a query
+        assert mock_cosmos_container.queries == 0
     
-    def test_multiple_secrets_isolation(self, mock_cosmos_container):
+    def test_multiple_secrets_isolation(self):
         """Test that multiple secrets are stored and retrieved independently."""
         secrets_data = [
             b"secret_1",
@@ -284,35 +290,14 @@ class TestStorageIntegration:
             b"secret_3"
         ]
         
-        # Override create_item side_effect 
-        mock_cosmos_container.create_item.side_effect = None
-        
-        with patch('app.storage.get_container', return_value=mock_cosmos_container):
-            # Store all secrets
-            link_ids = []
-            for data in secrets_data:
-                link_id = store_encrypted_secret(data)
-                link_ids.append(link_id)
-            
-            # Mock retrieve responses
-            from app.models import Secret
-            mock_secrets = []
-            for i, (link_id, data) in enumerate(zip(link_ids, secrets_data)):
-                mock_secret = Secret(
-                    link_id=link_id,
-                    encrypted_secret=data,
-                    is_e2ee=False,
-                    mime_type="text/plain"
-                )
-                mock_secrets.append(mock_secret)
-            
-            # Test retrieving specific secret
-            mock_cosmos_container.read_item.side_effect = None
-            mock_cosmos_container.read_item.return_value = mock_secrets[1].to_dict()
-            
-            # Override delete_item side_effect 
-            mock_cosmos_container.delete_item.side_effect = None
-            
-            retrieved = retrieve_and_delete_secret(link_ids[1])
-            assert retrieved is not None
-            assert retrieved.encrypted_secret == secrets_data[1]
\ No newline at end of file
+        # Store all secrets
+        link_ids = [store_encrypted_secret(data) for data in secrets_data]
+        
+        # Test retrieving specific secret
+        retrieved = retrieve_and_delete_secret(link_ids[1])
+        assert retrieved is not None
+        assert retrieved.encrypted_secret == secrets_data[1]
+        
+        # The other secrets are untouched
+        assert retrieve_secret(link_ids[0]).encrypted_secret == secrets_data[0]
+        assert retrieve_secret(link_ids[2]).encrypted_secret == secrets_data[2]